@@ -13,20 +13,27 @@
 #      ✅ NUEVOS INGRESOS (<42 días): Opción para incluir o excluir su meta de las sumas globales.
 
 import os
+import re
 import unicodedata
 from datetime import datetime, date
+from functools import lru_cache, partial
 from io import BytesIO
-from typing import TYPE_CHECKING, Optional, Dict, Callable
+from typing import TYPE_CHECKING, Callable, Optional, Dict
+from urllib.parse import quote_plus
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import PatternFill, Font
+import xlsxwriter
 
 # -------------------------------
 # CONFIG
 # -------------------------------
+# Copy-on-Write: filtered frames / column subsets share buffers until written,
+# so the script never needs defensive .copy() calls
+pd.set_option("mode.copy_on_write", True)
+
 st.set_page_config(
     page_title="Metas Mensuales CC",
     page_icon="📈",
@@ -107,6 +114,33 @@ def normalize_name(s: str) -> str:
     return s
 
 
+# Unicode "combining" blocks (accents/diacritics); NFKD leaves them as separate code points
+_COMBINING_MARKS_RE = r"[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]"
+
+
+def normalize_name_series(s: pd.Series) -> pd.Series:
+    """
+    Vectorized normalize_name() for a whole column.
+    Names / statuses repeat a lot, so the .str pipeline runs once per distinct
+    value and the result is mapped back. Nulls -> "".
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # normalize the category table and broadcast through the codes
+        cat_norm = normalize_name_series(pd.Series(s.cat.categories))
+        return pd.Series(np.append(cat_norm.to_numpy(dtype=object), "")[s.cat.codes.to_numpy()], index=s.index)
+
+    uniq = pd.Series(s.dropna().unique())
+    norm = (
+        uniq.astype(str)
+        .str.strip()
+        .str.upper()
+        .str.replace(r"\s+", " ", regex=True)
+        .str.normalize("NFKD")
+        .str.replace(_COMBINING_MARKS_RE, "", regex=True)
+    )
+    return s.map(dict(zip(uniq, norm))).fillna("")
+
+
 def normalize_folio_key(x) -> str:
     """
     Make FOLIO join-compatible between:
@@ -132,12 +166,34 @@ def normalize_folio_key(x) -> str:
     return s
 
 
+def normalize_folio_series(s: pd.Series) -> pd.Series:
+    """
+    Vectorized normalize_folio_key() for a whole column.
+    Folios repeat across statuses, so the regex runs once per distinct value.
+    """
+    uniq = pd.Series(s.dropna().unique())
+    key = uniq.astype(str).str.strip()
+    key = key.str.replace(r"^(\d+)\.0*$", r"\1", regex=True)
+    key = key.mask(key.str.lower().isin(["", "nan", "none"]), "")
+    return s.map(dict(zip(uniq, key))).fillna("")
+
+
+def _is_blank_series(s: pd.Series) -> pd.Series:
+    # null / "" / "nan" / "none" (any case, surrounding spaces ignored)
+    if pd.api.types.is_float_dtype(s):
+        return s.isna()
+    return s.isna() | s.astype(str).str.strip().str.lower().isin(["", "nan", "none"])
+
+
 def _avg_ignore_leading_zeros(vals: np.ndarray) -> np.ndarray:
     # vals: shape (n_rows, n_cols)
     if vals is None:
         return np.zeros(0, dtype=float)
     if vals.ndim != 2:
         vals = np.asarray(vals).reshape(-1, 1)
+    # DataFrame.values of a month block is often F-ordered; the scans below run along rows.
+    # Monthly counts per ejecutivo fit in int16; sums accumulate in int32.
+    vals = np.ascontiguousarray(vals, dtype=np.int16)
     n_rows, n_cols = vals.shape
     if n_cols == 0:
         return np.zeros(n_rows, dtype=float)
@@ -146,9 +202,11 @@ def _avg_ignore_leading_zeros(vals: np.ndarray) -> np.ndarray:
     has_nonzero = nonzero.any(axis=1)
     first_idx = np.where(has_nonzero, nonzero.argmax(axis=1), 0)
 
-    suffix_sum = np.cumsum(vals[:, ::-1], axis=1)[:, ::-1]
+    # active-suffix sum = row total - prefix before the first non-zero month
+    row_total = vals.sum(axis=1, dtype=np.int32)
+    prefix = np.cumsum(vals, axis=1, dtype=np.int32)
     row_ix = np.arange(n_rows)
-    sum_active = suffix_sum[row_ix, first_idx]
+    sum_active = row_total - np.where(first_idx > 0, prefix[row_ix, first_idx - 1], 0)
     count_active = (n_cols - first_idx).astype(float)
 
     avg_active = sum_active / count_active
@@ -177,133 +235,163 @@ def _meta_from_prom_and_tenure(prom: np.ndarray, tenure_days: np.ndarray) -> np.
     return meta.astype(int)
 
 
-def _to_excel_bytes(df: pd.DataFrame, sheet_name: str, style_fn: Optional[Callable] = None) -> bytes:
-    out = BytesIO()
-    with pd.ExcelWriter(out, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
-        ws = writer.sheets[sheet_name]
-        for i, col in enumerate(df.columns, 1):
-            max_len = max(df[col].astype(str).map(len).max(), len(str(col))) + 2
-            ws.column_dimensions[get_column_letter(i)].width = min(55, max_len)
+def _excel_col_width(s: pd.Series, col) -> float:
+    # a head() sample is enough: widths are capped at 55 anyway
+    sample_len = s.head(2000).astype("string").str.len().max()
+    sample_len = 0 if pd.isna(sample_len) else int(sample_len)
+    return min(55, max(sample_len, len(str(col))) + 2)
 
-        if callable(style_fn):
-            style_fn(ws, df)
 
-    return out.getvalue()
+def _excel_formats(wb: xlsxwriter.Workbook) -> dict:
+    # registered once per workbook and shared by every sheet written into it
+    formats = {k: wb.add_format(v) for k, v in EXCEL_STYLES.items()}
+    formats["_header"] = wb.add_format(FMT_HEADER)
+    return formats
+
+
+def _excel_write_sheet(
+    wb: xlsxwriter.Workbook,
+    sheet_name: str,
+    df: pd.DataFrame,
+    styles: Optional[np.ndarray],
+    formats: dict,
+):
+    """
+    Write df row by row (constant_memory flushes each row to disk as soon as the next one starts).
+    styles: optional (n_rows, n_cols) array of EXCEL_STYLES keys ("" = no style).
+    formats: output of _excel_formats(wb).
+    """
+    ws = wb.add_worksheet(sheet_name)
+
+    for j, col in enumerate(df.columns):
+        ws.set_column(j, j, _excel_col_width(df[col], col))
 
+    ws.write_row(0, 0, [str(c) for c in df.columns], formats["_header"])
 
+    values = df.astype(object).where(df.notna(), None).to_numpy()
+    styled = (styles != "").any(axis=1) if styles is not None else np.zeros(len(df), dtype=bool)
+    for i, row in enumerate(values, 1):
+        if not styled[i - 1]:
+            ws.write_row(i, 0, row)
+            continue
+        for j, v in enumerate(row):
+            key = styles[i - 1, j]
+            if key:
+                ws.write(i, j, v, formats[key])
+            else:
+                ws.write(i, j, v)
+
+
+def _new_workbook(out: BytesIO) -> xlsxwriter.Workbook:
+    return xlsxwriter.Workbook(out, {"constant_memory": True, "strings_to_urls": False})
+
+
+# Cached on the frame + style-matrix content, so reruns with the same tables reuse the
+# bytes; call sites reach it through _excel_bytes_on_download.
+@st.cache_data(ttl=600, show_spinner=False)
 def _to_excel_bytes_multi(
     sheets: Dict[str, pd.DataFrame],
-    style_fns: Optional[Dict[str, Callable]] = None
+    styles: Optional[Dict[str, np.ndarray]] = None
 ) -> bytes:
+    # one workbook, one format table, one zip finalize for all sheets
     out = BytesIO()
-    with pd.ExcelWriter(out, engine="openpyxl") as writer:
-        for sh, dff in sheets.items():
-            shn = sh[:31]
-            dff.to_excel(writer, sheet_name=shn, index=False)
-            ws = writer.sheets[shn]
-            for i, col in enumerate(dff.columns, 1):
-                max_len = max(dff[col].astype(str).map(len).max(), len(str(col))) + 2
-                ws.column_dimensions[get_column_letter(i)].width = min(55, max_len)
-
-            if style_fns and sh in style_fns and callable(style_fns[sh]):
-                style_fns[sh](ws, dff)
-
+    wb = _new_workbook(out)
+    formats = _excel_formats(wb)
+    for sh, dff in sheets.items():
+        _excel_write_sheet(wb, sh[:31], dff, (styles or {}).get(sh), formats)
+    wb.close()
     return out.getvalue()
 
 
 # -------------------------------
-# EXCEL STYLES (fills/fonts)
+# EXCEL STYLES (xlsxwriter format properties)
 # -------------------------------
-FILL_ROW_YELLOW = PatternFill("solid", fgColor="FFFFD166")   # #ffd166
-FILL_RED        = PatternFill("solid", fgColor="FFFF1F3D")   # #ff1f3d
-FILL_META_YEL   = PatternFill("solid", fgColor="FFFFF3B0")   # #fff3b0
-FILL_GREEN      = PatternFill("solid", fgColor="FF2ECC71")   # #2ecc71
-FILL_BLUE       = PatternFill("solid", fgColor="FF1E90FF")   # #1e90ff
-
-FONT_WHITE_BOLD = Font(bold=True, color="FFFFFFFF")
-FONT_BLACK_BOLD = Font(bold=True, color="FF000000")
-
+FILL_ROW_YELLOW = {"pattern": 1, "bg_color": "#FFD166"}
+FILL_RED        = {"pattern": 1, "bg_color": "#FF1F3D"}
+FILL_META_YEL   = {"pattern": 1, "bg_color": "#FFF3B0"}
+FILL_GREEN      = {"pattern": 1, "bg_color": "#2ECC71"}
+FILL_BLUE       = {"pattern": 1, "bg_color": "#1E90FF"}
+
+FONT_WHITE_BOLD = {"bold": True, "font_color": "#FFFFFF"}
+FONT_BLACK_BOLD = {"bold": True, "font_color": "#000000"}
+
+# header look of pandas' to_excel
+FMT_HEADER = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+EXCEL_STYLES = {
+    "red":        {**FILL_RED,        **FONT_WHITE_BOLD},
+    "row_yellow": {**FILL_ROW_YELLOW, **FONT_BLACK_BOLD},
+    "meta_yel":   {**FILL_META_YEL,   **FONT_BLACK_BOLD},
+    "green":      {**FILL_GREEN,      **FONT_WHITE_BOLD},
+    "blue":       {**FILL_BLUE,       **FONT_WHITE_BOLD},
+}
+META_FLAG_STYLE = {"ROJO": "red", "AMARILLO": "meta_yel", "VERDE": "green"}
 
-def _excel_fill_row(ws, excel_row: int, ncols: int, fill, font=None):
-    for c in range(1, ncols + 1):
-        cell = ws.cell(row=excel_row, column=c)
-        cell.fill = fill
-        if font is not None:
-            cell.font = font
+# fixed-width str (not object) so st.cache_data hashes the style matrix by content
+EXCEL_STYLE_DTYPE = f"<U{max(len(k) for k in EXCEL_STYLES)}"
 
 
-def _excel_fill_cell(ws, excel_row: int, excel_col: int, fill, font=None):
-    cell = ws.cell(row=excel_row, column=excel_col)
-    cell.fill = fill
-    if font is not None:
-        cell.font = font
+def _excel_styles_for(df: pd.DataFrame) -> np.ndarray:
+    return np.full(df.shape, "", dtype=EXCEL_STYLE_DTYPE)
 
 
-def _style_simulacion_excel(ws, df: pd.DataFrame, set_nuevos_42d: set, meta_color_map: Dict[str, str]):
-    ncols = len(df.columns)
+def _style_simulacion_excel(df: pd.DataFrame, is_nuevo: np.ndarray, meta_color_map: Dict[str, str]) -> np.ndarray:
+    styles = _excel_styles_for(df)
     if "status" not in df.columns or "EJECUTIVO" not in df.columns or "meta simulacion" not in df.columns:
-        return
+        return styles
 
-    meta_col = int(df.columns.get_loc("meta simulacion")) + 1
+    meta_col = int(df.columns.get_loc("meta simulacion"))
 
     for i in range(len(df)):
-        r = i + 2
         ej = df.at[i, "EJECUTIVO"]
         stt = str(df.at[i, "status"]).upper().strip()
-        ej_norm = normalize_name(ej)
 
         if stt == "BAJA":
-            _excel_fill_row(ws, r, ncols, FILL_RED, FONT_WHITE_BOLD)
+            styles[i, :] = "red"
             continue
 
-        if ej_norm in set_nuevos_42d:
-            _excel_fill_row(ws, r, ncols, FILL_ROW_YELLOW, FONT_BLACK_BOLD)
+        if is_nuevo[i]:
+            styles[i, :] = "row_yellow"
 
         flag = meta_color_map.get(ej, "")
-        if flag == "ROJO":
-            _excel_fill_cell(ws, r, meta_col, FILL_RED, FONT_WHITE_BOLD)
-        elif flag == "AMARILLO":
-            _excel_fill_cell(ws, r, meta_col, FILL_META_YEL, FONT_BLACK_BOLD)
-        elif flag == "VERDE":
-            _excel_fill_cell(ws, r, meta_col, FILL_GREEN, FONT_WHITE_BOLD)
+        if flag in META_FLAG_STYLE:
+            styles[i, meta_col] = META_FLAG_STYLE[flag]
+
+    return styles
 
 
-def _style_metas_excel(ws, df: pd.DataFrame, set_nuevos_42d: set, meta_color_map: Dict[str, str]):
-    ncols = len(df.columns)
+def _style_metas_excel(df: pd.DataFrame, is_nuevo: np.ndarray, meta_color_map: Dict[str, str]) -> np.ndarray:
+    styles = _excel_styles_for(df)
     if "EJECUTIVO" not in df.columns or "meta_mes_actual" not in df.columns:
-        return
+        return styles
 
-    meta_col = int(df.columns.get_loc("meta_mes_actual")) + 1
+    meta_col = int(df.columns.get_loc("meta_mes_actual"))
 
     for i in range(len(df)):
-        r = i + 2
         ej = df.at[i, "EJECUTIVO"]
-        ej_norm = normalize_name(ej)
 
-        if ej_norm in set_nuevos_42d:
-            _excel_fill_row(ws, r, ncols, FILL_ROW_YELLOW, FONT_BLACK_BOLD)
+        if is_nuevo[i]:
+            styles[i, :] = "row_yellow"
 
         flag = meta_color_map.get(ej, "")
-        if flag == "ROJO":
-            _excel_fill_cell(ws, r, meta_col, FILL_RED, FONT_WHITE_BOLD)
-        elif flag == "AMARILLO":
-            _excel_fill_cell(ws, r, meta_col, FILL_META_YEL, FONT_BLACK_BOLD)
-        elif flag == "VERDE":
-            _excel_fill_cell(ws, r, meta_col, FILL_GREEN, FONT_WHITE_BOLD)
+        if flag in META_FLAG_STYLE:
+            styles[i, meta_col] = META_FLAG_STYLE[flag]
+
+    return styles
 
 
-def _style_sanity_excel(ws, df: pd.DataFrame, set_nuevos_42d: Optional[set] = None):
-    ncols = len(df.columns)
+def _style_sanity_excel(df: pd.DataFrame, is_nuevo: Optional[np.ndarray] = None) -> np.ndarray:
+    styles = _excel_styles_for(df)
 
-    col_ej = df.columns.get_loc("EJECUTIVO") + 1 if "EJECUTIVO" in df.columns else None
+    if is_nuevo is not None:
+        styles[is_nuevo] = "row_yellow"
 
     gap_candidates = ["gap_meta", "gap_team", "gap_centro", "gap_global"]
     gap_col = None
     gap_name = None
     for gc in gap_candidates:
         if gc in df.columns:
-            gap_col = df.columns.get_loc(gc) + 1
+            gap_col = df.columns.get_loc(gc)
             gap_name = gc
             break
 
@@ -312,21 +400,13 @@ def _style_sanity_excel(ws, df: pd.DataFrame, set_nuevos_42d: Optional[set] = No
     trans_name = None
     for tc in trans_candidates:
         if tc in df.columns:
-            trans_col = df.columns.get_loc(tc) + 1
+            trans_col = df.columns.get_loc(tc)
             trans_name = tc
             break
 
     has_alcorr = "al_corriente" in df.columns
 
     for i in range(len(df)):
-        r = i + 2
-
-        if set_nuevos_42d and col_ej is not None:
-            ej = df.iat[i, col_ej - 1]
-            ej_norm = normalize_name(ej)
-            if ej_norm in set_nuevos_42d:
-                _excel_fill_row(ws, r, ncols, FILL_ROW_YELLOW, FONT_BLACK_BOLD)
-
         if gap_col is not None and gap_name is not None:
             try:
                 gap_val = int(df.at[i, gap_name] or 0)
@@ -341,7 +421,7 @@ def _style_sanity_excel(ws, df: pd.DataFrame, set_nuevos_42d: Optional[set] = No
                     al_corr = True
 
             if (gap_val > 0) and (not al_corr):
-                _excel_fill_cell(ws, r, gap_col, FILL_RED, FONT_WHITE_BOLD)
+                styles[i, gap_col] = "red"
 
         if trans_col is not None and trans_name is not None:
             try:
@@ -349,7 +429,45 @@ def _style_sanity_excel(ws, df: pd.DataFrame, set_nuevos_42d: Optional[set] = No
             except Exception:
                 tv = 0
             if tv > 0:
-                _excel_fill_cell(ws, r, trans_col, FILL_BLUE, FONT_WHITE_BOLD)
+                styles[i, trans_col] = "blue"
+
+    return styles
+
+
+def _excel_bytes_on_download(
+    sheets: Dict[str, pd.DataFrame],
+    style_fns: Optional[Dict[str, Callable[[pd.DataFrame], np.ndarray]]] = None,
+) -> bytes:
+    # handed to st.download_button via partial(): the style matrices (row loops) and the
+    # workbook are only built when someone actually clicks download
+    styles = {sh: fn(sheets[sh]) for sh, fn in (style_fns or {}).items()}
+    return _to_excel_bytes_multi(sheets, styles=styles or None)
+
+
+def _with_day_count_columns(df: pd.DataFrame, dias_mes: float, dias_restantes: float) -> pd.DataFrame:
+    # the month / remaining workable-day counts are one scalar per month: on screen they are a
+    # caption, the workbook keeps them as columns next to the daily-pace columns they feed
+    out = df.copy(deep=False)
+    pos_mes = 1 if "mes" in out.columns else out.columns.get_loc("ventas_diarias_necesarias")
+    out.insert(pos_mes, "dias_hab_equiv_mes", float(dias_mes))
+    pos_rest = out.columns.get_loc("ventas_diarias_necesarias_desde_hoy")
+    out.insert(pos_rest, "dias_hab_equiv_restantes", float(dias_restantes))
+    return out
+
+
+def _sanity_to_excel_bytes(
+    sheets: Dict[str, pd.DataFrame],
+    exec_sheet: str,
+    exec_is_nuevo: np.ndarray,
+    dias_mes: float,
+    dias_restantes: float,
+) -> bytes:
+    sheets = {sh: _with_day_count_columns(dff, dias_mes, dias_restantes) for sh, dff in sheets.items()}
+    style_fns = {
+        sh: partial(_style_sanity_excel, is_nuevo=exec_is_nuevo if sh == exec_sheet else None)
+        for sh in sheets
+    }
+    return _excel_bytes_on_download(sheets, style_fns)
 
 
 # -------------------------------
@@ -373,12 +491,8 @@ def get_db_cfg():
     }
 
 
-@st.cache_data(ttl=600, show_spinner=False)
-def read_sql(query: str) -> pd.DataFrame:
-    import pyodbc
-
-    cfg = get_db_cfg()
-    conn_str = (
+def _odbc_conn_str(cfg: dict) -> str:
+    return (
         f"DRIVER={{{cfg['driver']}}};"
         f"SERVER={cfg['server']};"
         f"DATABASE={cfg['database']};"
@@ -386,12 +500,153 @@ def read_sql(query: str) -> pd.DataFrame:
         f"PWD={cfg['password']};"
         "TrustServerCertificate=yes;"
     )
+
+
+def _mssql_url(cfg: dict) -> str:
+    # connectorx talks TDS directly (no ODBC driver); "host,port" -> "host:port"
+    server = cfg["server"].replace(",", ":")
+    user = quote_plus(cfg["username"])
+    pwd = quote_plus(cfg["password"])
+    return f"mssql://{user}:{pwd}@{server}/{cfg['database']}?trust_server_certificate=true"
+
+
+SQL_FETCH_BATCH = 10000
+
+
+def _as_string_array(vals) -> pa.Array:
+    # pd.read_sql kept columns without one consistent type (sql_variant, uniqueidentifier,
+    # varchar with stray numerics, ...) as object; the Arrow equivalent is text
+    return pa.array([None if v is None else str(v) for v in vals], type=pa.string())
+
+
+def _rows_to_arrow(rows: list, chunks: list) -> None:
+    # transpose one fetchmany() batch into per-column Arrow arrays
+    for j, vals in enumerate(zip(*rows)):
+        try:
+            arr = pa.array(vals, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arr = _as_string_array(vals)
+        if pa.types.is_decimal(arr.type):
+            # same as pd.read_sql(coerce_float=True): Decimal -> float64
+            arr = arr.cast(pa.float64())
+        chunks[j].append(arr)
+
+
+def _fetch_arrow_pyodbc(query: str, conn_str: str) -> pa.Table:
+    import pyodbc
+
     with pyodbc.connect(conn_str) as conn:
-        return pd.read_sql(query, conn)
+        cur = conn.cursor()
+        cur.execute(query)
+        columns = [c[0] for c in cur.description]
+        chunks = [[] for _ in columns]
+        while True:
+            rows = cur.fetchmany(SQL_FETCH_BATCH)
+            if not rows:
+                break
+            _rows_to_arrow(rows, chunks)
+
+    arrays = []
+    for col_chunks in chunks:
+        if not col_chunks:
+            arrays.append(pa.array([], type=pa.null()))
+            continue
+        # a batch with only NULLs infers pa.null(); align it to the real type
+        typ = next((a.type for a in col_chunks if not pa.types.is_null(a.type)), pa.null())
+        try:
+            arrays.append(pa.chunked_array([a if a.type == typ else a.cast(typ) for a in col_chunks], type=typ))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # batches inferred different types (e.g. int in one, text in the next)
+            arrays.append(pa.chunked_array([a.cast(pa.string()) for a in col_chunks], type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=columns)
+
+
+def _fetch_arrow_turbodbc(query: str, conn_str: str) -> pa.Table:
+    import turbodbc
+
+    conn = turbodbc.connect(connection_string=conn_str)
+    try:
+        cur = conn.cursor()
+        cur.execute(query)
+        return cur.fetchallarrow()
+    finally:
+        conn.close()
+
+
+def _fetch_arrow_connectorx(query: str, url: str) -> pa.Table:
+    import connectorx as cx
+
+    tbl = cx.read_sql(url, query, return_type="arrow")
+    # keep the same dtypes as the ODBC paths: Decimal -> float64
+    for j, field in enumerate(tbl.schema):
+        if pa.types.is_decimal(field.type):
+            tbl = tbl.set_column(j, field.name, tbl.column(j).cast(pa.float64()))
+    return tbl
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _read_sql_arrow(query: str) -> pa.Table:
+    # Columnar fetch: connectorx / turbodbc (both optional) build Arrow buffers
+    # without one PyObject per cell; pyodbc stays as fallback. The cache keeps
+    # the Arrow table, which is much cheaper to (un)pickle than an object DataFrame.
+    cfg = get_db_cfg()
+    try:
+        import connectorx  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        return _fetch_arrow_connectorx(query, _mssql_url(cfg))
+
+    conn_str = _odbc_conn_str(cfg)
+    try:
+        import turbodbc  # noqa: F401
+    except ImportError:
+        return _fetch_arrow_pyodbc(query, conn_str)
+    return _fetch_arrow_turbodbc(query, conn_str)
+
+
+def read_sql(query: str) -> pd.DataFrame:
+    return _read_sql_arrow(query).to_pandas()
+
+
+EMPLEADOS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+EMPLEADOS_CACHE_PATH = os.path.join(EMPLEADOS_CACHE_DIR, "empleados.parquet")
+EMPLEADOS_CACHE_MAX_AGE_S = 3600  # same staleness bound as load_empleados' st.cache_data ttl
+
+
+def _write_empleados_cache(df: pd.DataFrame) -> None:
+    # best effort: a read-only deploy or a frame pyarrow can't serialize just falls back
+    # to the SQL query every process
+    try:
+        os.makedirs(EMPLEADOS_CACHE_DIR, exist_ok=True)
+        tmp = EMPLEADOS_CACHE_PATH + ".tmp"
+        df.to_parquet(tmp, compression="zstd", index=False)
+        os.replace(tmp, EMPLEADOS_CACHE_PATH)
+    except Exception:
+        pass
+
+
+def clear_empleados_cache() -> None:
+    # "Actualizar datos" must reach the DB again, not just drop the in-process L1
+    try:
+        os.remove(EMPLEADOS_CACHE_PATH)
+    except OSError:
+        pass
 
 
 @st.cache_data(ttl=3600, show_spinner=False)
 def load_empleados() -> pd.DataFrame:
+    # L1 = st.cache_data (per process), L2 = parquet file younger than 1h (survives restarts)
+    try:
+        fresh = (datetime.now().timestamp() - os.path.getmtime(EMPLEADOS_CACHE_PATH)) < EMPLEADOS_CACHE_MAX_AGE_S
+    except OSError:
+        fresh = False
+    if fresh:
+        try:
+            return pd.read_parquet(EMPLEADOS_CACHE_PATH)
+        except Exception:
+            pass
+
     q = r"""
     SELECT
       Tienda AS Centro,
@@ -426,6 +681,8 @@ def load_empleados() -> pd.DataFrame:
 
     df["Supervisor"] = df["Jefe Inmediato"].replace({None: "", "None": ""}).astype(str).str.strip()
     df["Supervisor"] = df["Supervisor"].replace({"": "BAJA"})
+
+    _write_empleados_cache(df)
     return df
 
 
@@ -434,14 +691,12 @@ def build_ventas_query(start_yyyymmdd: str, end_yyyymmdd: str) -> str:
     SELECT
       FOLIO,
       [PTO. DE VENTA] AS CENTRO,
-      [OPERACION PDV],
       [ESTATUS],
       [EJECUTIVO],
       [FECHA DE CAPTURA],
       [PLAN],
       [RENTA SIN IMPUESTOS],
-      [PRECIO],
-      [SUBREGION]
+      [PRECIO]
     FROM reporte_ventas_no_conciliadas('EMPRESA_MAESTRA', 4, '{start_yyyymmdd}', '{end_yyyymmdd}', 1, '19000101', '20990101')
     WHERE
       [OPERACION PDV] = 'CONTACT CENTER'
@@ -493,60 +748,105 @@ def build_programadas_query(start_yyyymmdd: str, end_yyyymmdd: str) -> str:
     """
 
 
+def _month_segments(start_yyyymmdd: str, end_yyyymmdd: str) -> list:
+    """
+    Split [start, end] into calendar-month pieces (YYYYMMDD, YYYYMMDD).
+    Loaders cache per piece, so moving the end date only misses the last month.
+    """
+    start = datetime.strptime(start_yyyymmdd, "%Y%m%d").date()
+    end = datetime.strptime(end_yyyymmdd, "%Y%m%d").date()
+    segs = []
+    for ms in pd.date_range(pd.Timestamp(start.year, start.month, 1), pd.Timestamp(end), freq="MS"):
+        seg_start = max(ms.date(), start)
+        seg_end = min((ms + pd.offsets.MonthEnd(1)).date(), end)
+        segs.append((seg_start.strftime("%Y%m%d"), seg_end.strftime("%Y%m%d")))
+    return segs
+
+
+def _concat_months(parts: list) -> pd.DataFrame:
+    non_empty = [p for p in parts if not p.empty]
+    if not non_empty:
+        return parts[0] if parts else pd.DataFrame()
+    return pd.concat(non_empty, ignore_index=True)
+
+
+PROGRAMACION_TRANSITO = {"EN ENTREGA", "EN PREPARACION", "SOLICITADO", "BACK OFFICE"}
+
+
+def _classify_programacion(df: pd.DataFrame) -> pd.DataFrame:
+    """IS_TRANSITO / IS_CANC flags for reporte_programacion_entrega rows (ESTATUS + VENTA)."""
+    est_cat = pd.Categorical(normalize_name_series(df["ESTATUS"].astype(str).str.strip()))
+    codes = est_cat.codes
+    cats = est_cat.categories
+
+    # no VENTA column -> no ENTREGADO row counts as tránsito (the per-row check saw "<NA>")
+    if "VENTA" in df.columns:
+        venta_vacia = _is_blank_series(df["VENTA"]).to_numpy(dtype=bool)
+    else:
+        venta_vacia = np.zeros(len(df), dtype=bool)
+
+    # compare int codes instead of strings; get_indexer gives -1 for absent statuses
+    transito_codes = cats.get_indexer(sorted(PROGRAMACION_TRANSITO))
+    entregado_code = cats.get_indexer(["ENTREGADO"])[0]
+    canc_code = cats.get_indexer(["CANC ERROR"])[0]
+
+    is_transito = np.isin(codes, transito_codes[transito_codes >= 0]) | (
+        (codes == entregado_code) & (entregado_code >= 0) & venta_vacia
+    )
+    is_canc = (codes == canc_code) & (canc_code >= 0)
+    return pd.DataFrame({"IS_TRANSITO": is_transito, "IS_CANC": is_canc}, index=df.index)
+
+
 @st.cache_data(ttl=600, show_spinner=False)
-def load_programadas_split_by_exec(start_yyyymmdd: str, end_yyyymmdd: str) -> pd.DataFrame:
+def _load_programadas_month(start_yyyymmdd: str, end_yyyymmdd: str) -> pd.DataFrame:
     q = build_programadas_query(start_yyyymmdd, end_yyyymmdd)
     df = read_sql(q)
 
     if df.empty:
-        return pd.DataFrame(columns=["VENDEDOR", "hechas_mes", "transito_mes", "total_mes", "VEN_NORM"])
+        return pd.DataFrame(columns=["VENDEDOR", "IS_TRANSITO"])
 
     df["VENDEDOR"] = df["VENDEDOR"].astype(str).str.strip()
-    df["ESTATUS"] = df["ESTATUS"].astype(str).str.strip()
-    est_norm = df["ESTATUS"].map(normalize_name)
-
-    venta = df["VENTA"] if "VENTA" in df.columns else pd.Series(pd.NA, index=df.index)
-
-    def _venta_vacia(x):
-        if x is None:
-            return True
-        if isinstance(x, float) and np.isnan(x):
-            return True
-        s = str(x).strip()
-        return s == "" or s.lower() == "nan" or s.lower() == "none"
+    cls = _classify_programacion(df)
+    keep = ~cls["IS_CANC"].to_numpy(dtype=bool)
+    return pd.DataFrame(
+        {
+            "VENDEDOR": df.loc[keep, "VENDEDOR"],
+            "IS_TRANSITO": cls.loc[keep, "IS_TRANSITO"],
+        }
+    ).reset_index(drop=True)
 
-    venta_vacia = venta.map(_venta_vacia)
 
-    is_transito = est_norm.isin({"EN ENTREGA", "EN PREPARACION", "SOLICITADO", "BACK OFFICE"}) | (
-        est_norm.eq("ENTREGADO") & venta_vacia
+@st.cache_data(ttl=600, show_spinner=False)
+def load_programadas_split_by_exec(start_yyyymmdd: str, end_yyyymmdd: str) -> pd.DataFrame:
+    df = _concat_months(
+        [_load_programadas_month(a, b) for a, b in _month_segments(start_yyyymmdd, end_yyyymmdd)]
     )
 
-    is_canc = est_norm.eq("CANC ERROR")
-    df = df[~is_canc].copy()
-    is_transito = is_transito[~is_canc]
+    # indexed by VEN_NORM so callers can .join() on their normalized ejecutivo column
+    if df.empty:
+        return pd.DataFrame(columns=["VENDEDOR", "hechas_mes", "transito_mes", "total_mes", "VEN_NORM"]).set_index("VEN_NORM")
 
-    out = df[["VENDEDOR"]].copy()
-    out["transito_mes"] = is_transito.astype(int)
-    out["hechas_mes"] = (~is_transito).astype(int)
+    # per-VENDEDOR counts via integer codes + bincount (no string-keyed groupby)
+    codes, vendedores = pd.factorize(df["VENDEDOR"], sort=True)
+    n_ven = len(vendedores)
+    transito_mes = np.bincount(codes, weights=df["IS_TRANSITO"].to_numpy(dtype=bool), minlength=n_ven).astype(int)
+    total_mes = np.bincount(codes, minlength=n_ven).astype(int)
 
-    g = (
-        out.groupby("VENDEDOR", as_index=False)
-        .agg(
-            hechas_mes=("hechas_mes", "sum"),
-            transito_mes=("transito_mes", "sum"),
-        )
-        .copy()
+    g = pd.DataFrame(
+        {
+            "VENDEDOR": np.asarray(vendedores),
+            "hechas_mes": total_mes - transito_mes,
+            "transito_mes": transito_mes,
+            "total_mes": total_mes,
+        }
     )
-    g["hechas_mes"] = pd.to_numeric(g["hechas_mes"], errors="coerce").fillna(0).astype(int)
-    g["transito_mes"] = pd.to_numeric(g["transito_mes"], errors="coerce").fillna(0).astype(int)
-    g["total_mes"] = (g["hechas_mes"] + g["transito_mes"]).astype(int)
 
-    g["VEN_NORM"] = g["VENDEDOR"].map(normalize_name)
-    return g
+    g["VEN_NORM"] = normalize_name_series(g["VENDEDOR"])
+    return g.set_index("VEN_NORM")
 
 
 @st.cache_data(ttl=600, show_spinner=False)
-def load_ventas(start_yyyymmdd: str, end_yyyymmdd: str) -> pd.DataFrame:
+def _load_ventas_month(start_yyyymmdd: str, end_yyyymmdd: str) -> pd.DataFrame:
     q = build_ventas_query(start_yyyymmdd, end_yyyymmdd)
     df = read_sql(q)
 
@@ -554,30 +854,23 @@ def load_ventas(start_yyyymmdd: str, end_yyyymmdd: str) -> pd.DataFrame:
     df["CENTRO"] = df["CENTRO"].astype(str).str.strip()
     df["PLAN"] = df["PLAN"].astype(str).str.strip()
 
-    df["FOLIO"] = df["FOLIO"].apply(normalize_folio_key)
-
-    def fix_centro(c: str) -> str:
-        c_up = str(c).upper()
-        if "JUAREZ" in c_up:
-            return "EXP ATT C CENTER JUAREZ"
-        if "CENTER 2" in c_up:
-            return "EXP ATT C CENTER 2"
-        return c
+    df["FOLIO"] = normalize_folio_series(df["FOLIO"])
 
-    df["CENTRO"] = df["CENTRO"].apply(fix_centro)
-    df["CentroKey"] = np.where(df["CENTRO"].str.upper().str.contains("JUAREZ", na=False), "JV", "CC2")
-
-    df["EJECUTIVO"] = df["EJECUTIVO"].replace(
-        {
-            "CESAR JAHACIEL ALONSO GARCIAA": "CESAR JAHACIEL ALONSO GARCIA",
-            "VICTOR BETANZO FUENTES": "VICTOR BETANZOS FUENTES",
-        }
+    cu = df["CENTRO"].str.upper()
+    is_juarez = cu.str.contains("JUAREZ", na=False, regex=False).to_numpy(dtype=bool)
+    is_cc2 = cu.str.contains("CENTER 2", na=False, regex=False).to_numpy(dtype=bool)
+    df["CENTRO"] = np.select(
+        [is_juarez, is_cc2],
+        ["EXP ATT C CENTER JUAREZ", "EXP ATT C CENTER 2"],
+        default=df["CENTRO"].to_numpy(dtype=object),
     )
+    # fixed category order keeps month chunks concat-able as categorical
+    df["CentroKey"] = pd.Categorical(np.where(is_juarez, "JV", "CC2"), categories=["CC2", "JV"])
 
     df["FECHA DE CAPTURA"] = pd.to_datetime(df["FECHA DE CAPTURA"], errors="coerce")
 
     df["ESTATUS"] = df["ESTATUS"].astype(str).str.strip()
-    est_norm = df["ESTATUS"].map(normalize_name)
+    est_norm = normalize_name_series(df["ESTATUS"])
 
     TRANSITO_KEYS = {
         "EN ENTREGA",
@@ -587,45 +880,78 @@ def load_ventas(start_yyyymmdd: str, end_yyyymmdd: str) -> pd.DataFrame:
         "EN TRANSITO",
     }
 
-    is_transito_by_status = (
-        est_norm.isin(TRANSITO_KEYS)
-        | est_norm.str.contains(r"\bTRANSITO\b", na=False)
-        | est_norm.str.contains(r"\bEN ENTREGA\b", na=False)
-        | est_norm.str.contains(r"\bEN PREPARACION\b", na=False)
-        | est_norm.str.contains(r"\bBACK OFFICE\b", na=False)
-        | est_norm.str.contains(r"\bSOLICITADO\b", na=False)
-    )
+    TRANSITO_RE = re.compile(r"\b(TRANSITO|EN ENTREGA|EN PREPARACION|BACK OFFICE|SOLICITADO)\b")
+    ENTREGADO_RE = re.compile(r"\bENTREGAD")
 
-    def _is_blank_series(x: pd.Series) -> pd.Series:
-        s = x.copy()
-        s = s.replace({None: np.nan, "None": np.nan})
-        s = s.astype(str).str.strip()
-        return s.isna() | s.eq("") | s.str.lower().eq("nan")
+    # ESTATUS has a handful of distinct values: classify each category once, then
+    # broadcast through the integer codes (trailing False catches code -1)
+    est_cat = pd.Categorical(est_norm)
+    cats = est_cat.categories
+    transito_flag = np.array([(u in TRANSITO_KEYS) or bool(TRANSITO_RE.search(u)) for u in cats] + [False])
+    entregado_flag = np.array([bool(ENTREGADO_RE.search(u)) for u in cats] + [False])
+    is_transito_by_status = transito_flag[est_cat.codes]
+    is_entregado = entregado_flag[est_cat.codes]
 
     blank_plan = _is_blank_series(df["PLAN"]) if "PLAN" in df.columns else pd.Series(False, index=df.index)
     blank_precio = _is_blank_series(df["PRECIO"]) if "PRECIO" in df.columns else pd.Series(False, index=df.index)
     blank_renta = _is_blank_series(df["RENTA SIN IMPUESTOS"]) if "RENTA SIN IMPUESTOS" in df.columns else pd.Series(False, index=df.index)
 
-    venta_vacia = blank_plan & blank_precio & blank_renta
-    is_entregado = est_norm.str.contains(r"\bENTREGAD", na=False)
+    venta_vacia = (blank_plan & blank_precio & blank_renta).to_numpy(dtype=bool)
     is_transito_entregado_sin_venta = is_entregado & venta_vacia
 
-    df["IS_TRANSITO"] = (is_transito_by_status | is_transito_entregado_sin_venta).astype(bool)
+    df["IS_TRANSITO"] = is_transito_by_status | is_transito_entregado_sin_venta
 
     return df
 
 
-def add_supervisor_join(ventas_df: pd.DataFrame, empleados_df: pd.DataFrame) -> pd.DataFrame:
-    emp = empleados_df[["Nombre", "Supervisor"]].copy()
-    emp["Nombre"] = emp["Nombre"].astype(str).str.strip()
-    emp["Nombre_norm"] = emp["Nombre"].map(normalize_name)
+EJECUTIVO_FIXES = {
+    "CESAR JAHACIEL ALONSO GARCIAA": "CESAR JAHACIEL ALONSO GARCIA",
+    "VICTOR BETANZO FUENTES": "VICTOR BETANZOS FUENTES",
+}
+
 
-    v = ventas_df.copy()
-    v["EJ_NORM"] = v["EJECUTIVO"].astype(str).map(normalize_name)
+def _fix_ejecutivo_names(s: pd.Series) -> pd.Series:
+    """
+    Apply EJECUTIVO_FIXES on the category table instead of row by row.
+    Returns a Categorical; a typo is merged into the right name if both exist.
+    """
+    ej = s.astype("category")
+    fixed = [EJECUTIVO_FIXES.get(c, c) for c in ej.cat.categories]
+    new_codes, new_cats = pd.factorize(pd.Index(fixed, dtype=object))
+    lookup = np.append(new_codes, -1)  # code -1 (NaN) stays -1
+    codes = lookup[ej.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=new_cats), index=s.index, name=s.name)
 
-    out = v.merge(emp[["Nombre_norm", "Supervisor"]], left_on="EJ_NORM", right_on="Nombre_norm", how="left")
-    out["Supervisor"] = out["Supervisor"].fillna("BAJA")
-    out.drop(columns=["Nombre_norm"], inplace=True, errors="ignore")
+
+def load_ventas(start_yyyymmdd: str, end_yyyymmdd: str) -> pd.DataFrame:
+    df = _concat_months(
+        [_load_ventas_month(a, b) for a, b in _month_segments(start_yyyymmdd, end_yyyymmdd)]
+    )
+    # after the concat, so every month shares one category table
+    df["EJECUTIVO"] = _fix_ejecutivo_names(df["EJECUTIVO"])
+    return df
+
+
+def add_supervisor_join(ventas_df: pd.DataFrame, empleados_df: pd.DataFrame) -> pd.DataFrame:
+    emp = empleados_df[["Nombre", "Supervisor"]]
+    emp["Nombre"] = emp["Nombre"].astype(str).str.strip()
+    emp["Nombre_norm"] = normalize_name_series(emp["Nombre"])
+
+    # normalize once per EJECUTIVO category and join on shared integer codes
+    # (no string hashing per sale row)
+    ej = ventas_df["EJECUTIVO"].astype("category")
+    ej_cat_norm = normalize_name_series(pd.Series(ej.cat.categories.astype(str)))
+    names = pd.Index(pd.unique(np.concatenate([emp["Nombre_norm"].to_numpy(dtype=object), ej_cat_norm.to_numpy(dtype=object)])))
+    cat_code = np.append(names.get_indexer(ej_cat_norm), -1)  # code -1 (NaN) -> -1
+    v_code = cat_code[ej.cat.codes.to_numpy()]
+    emp["_code"] = names.get_indexer(emp["Nombre_norm"])
+
+    # EJ_NORM rides on the left frame so it stays aligned when a duplicated empleado name
+    # fans one sale out into several rows
+    left = ventas_df.assign(EJ_NORM=np.append(names.to_numpy(dtype=object), "")[v_code], _code=v_code)
+    out = left.merge(emp[["_code", "Supervisor"]], on="_code", how="left")
+    out.drop(columns=["_code"], inplace=True)
+    out["Supervisor"] = out["Supervisor"].fillna("BAJA").astype("category")
     return out
 
 
@@ -641,6 +967,7 @@ btn_cols = st.sidebar.columns([1, 1])
 with btn_cols[0]:
     if st.button("🔄 Actualizar datos", use_container_width=True):
         st.cache_data.clear()
+        clear_empleados_cache()
         st.session_state["last_refresh"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
         st.rerun()
 with btn_cols[1]:
@@ -687,14 +1014,14 @@ try:
         empleados = load_empleados()
 
         # ✅ FILTER EMPLEADOS (before merging)
-        empleados["Sup_Norm"] = empleados["Supervisor"].map(normalize_name)
-        empleados = empleados[~empleados["Sup_Norm"].isin(EXCLUDED_SUPERVISORS_NORM)].drop(columns=["Sup_Norm"]).copy()
+        empleados["Sup_Norm"] = normalize_name_series(empleados["Supervisor"])
+        empleados = empleados[~empleados["Sup_Norm"].isin(EXCLUDED_SUPERVISORS_NORM)].drop(columns=["Sup_Norm"])
 
         ventas = add_supervisor_join(ventas_raw, empleados)
 
         # ✅ FILTER VENTAS (after merging supervisor info)
-        ventas["Sup_Norm"] = ventas["Supervisor"].map(normalize_name)
-        ventas = ventas[~ventas["Sup_Norm"].isin(EXCLUDED_SUPERVISORS_NORM)].drop(columns=["Sup_Norm"]).copy()
+        ventas["Sup_Norm"] = normalize_name_series(ventas["Supervisor"])
+        ventas = ventas[~ventas["Sup_Norm"].isin(EXCLUDED_SUPERVISORS_NORM)].drop(columns=["Sup_Norm"])
 
 except Exception as e:
     st.error("❌ No se pudo conectar al SQL Server (timeout / red / VPN / firewall).")
@@ -717,16 +1044,23 @@ if ventas.empty:
     st.error("No hay datos en el rango seleccionado.")
     st.stop()
 
-ventas["T_DT"] = pd.to_datetime(ventas["FECHA DE CAPTURA"], errors="coerce")
-ventas = ventas[ventas["T_DT"].notna()].copy()
-ventas["T_MonthKey"] = ventas["T_DT"].dt.strftime("%Y-%m")
-ventas["T_MonthName"] = ventas["T_DT"].dt.strftime("%B")
-ventas["T_MonthLabel"] = ventas["T_MonthKey"] + " (" + ventas["T_MonthName"] + ")"
+ventas["T_DT"] = ventas["FECHA DE CAPTURA"]  # parsed in _load_ventas_month
+ventas = ventas[ventas["T_DT"].notna()]
+# strftime once per distinct month, then broadcast the codes; np.unique sorts, so the
+# category order is chronological and sorting by T_MonthKey keeps working
+_months, _month_codes = np.unique(ventas["T_DT"].to_numpy().astype("datetime64[M]"), return_inverse=True)
+_month_idx = pd.DatetimeIndex(_months)
+_month_keys = _month_idx.strftime("%Y-%m")
+_month_names = _month_idx.strftime("%B")
+_name_cats, _name_codes = np.unique(np.asarray(_month_names), return_inverse=True)
+ventas["T_MonthKey"] = pd.Categorical.from_codes(_month_codes, _month_keys)
+ventas["T_MonthName"] = pd.Categorical.from_codes(_name_codes[_month_codes], _name_cats)
+ventas["T_MonthLabel"] = pd.Categorical.from_codes(_month_codes, _month_keys + " (" + _month_names + ")")
 
 month_map_all = (
     pd.concat(
         [
-            ventas[["T_MonthKey", "T_MonthLabel"]].dropna(),
+            ventas[["T_MonthKey", "T_MonthLabel"]].drop_duplicates().dropna(),
             all_months_map[["T_MonthKey", "T_MonthLabel"]].dropna(),
         ],
         ignore_index=True,
@@ -737,49 +1071,49 @@ month_map_all = (
 )
 
 # ✅ NEW: build Fecha Ingreso map (by normalized name) for tenure + nuevos ingresos
-emp_ing = empleados[["Nombre", "Fecha Ingreso"]].copy()
+emp_ing = empleados[["Nombre", "Fecha Ingreso"]]
 emp_ing["Nombre"] = emp_ing["Nombre"].astype(str).str.strip()
-emp_ing["EJ_NORM"] = emp_ing["Nombre"].map(normalize_name)
-emp_ing["Fecha Ingreso"] = pd.to_datetime(emp_ing["Fecha Ingreso"], errors="coerce")
-emp_ing = emp_ing[emp_ing["EJ_NORM"].notna() & (emp_ing["EJ_NORM"] != "")].copy()
+emp_ing["EJ_NORM"] = normalize_name_series(emp_ing["Nombre"])
+emp_ing = emp_ing[emp_ing["EJ_NORM"].notna() & (emp_ing["EJ_NORM"] != "")]
 
-ingreso_map_norm = (
+ingreso_by_norm = (
     emp_ing.dropna(subset=["Fecha Ingreso"])
-    .groupby("EJ_NORM")["Fecha Ingreso"]
+    .groupby("EJ_NORM", observed=True, sort=False)["Fecha Ingreso"]
     .min()
-    .to_dict()
 )
 
-ventas_norm_all = ventas.copy()
-ventas_norm_all["EJ_NORM"] = ventas_norm_all["EJECUTIVO"].astype(str).map(normalize_name)
+# ventas["EJ_NORM"] comes from add_supervisor_join
 first_dt_ventas_norm = (
-    ventas_norm_all.groupby("EJ_NORM")["T_DT"]
+    ventas.groupby("EJ_NORM", observed=True, sort=False)["T_DT"]
     .min()
-    .to_dict()
 )
 
-def _get_ingreso_dt_for_norm(ej_norm: str):
-    v = ingreso_map_norm.get(ej_norm)
-    if pd.isna(v) or v is None:
-        return first_dt_ventas_norm.get(ej_norm)
-    return v
+# Fecha Ingreso by EJ_NORM, falling back to the first sale; use as df["EJ_NORM"].map(ingreso_dt_by_norm).
+# Pinned to datetime64[ns] so every .map() result is already a datetime column.
+ingreso_dt_by_norm = ingreso_by_norm.combine_first(first_dt_ventas_norm).astype("datetime64[ns]")
 
 today_ts = pd.Timestamp(date.today())
-set_nuevos_42d = set()
-for ej_norm, f_ing in ingreso_map_norm.items():
-    if pd.notna(f_ing):
-        delta_days = (today_ts - f_ing).days
-        if 0 <= delta_days < 42:
-            set_nuevos_42d.add(ej_norm)
+_dias_desde_ingreso = (today_ts - ingreso_by_norm).dt.days
+set_nuevos_42d = set(ingreso_by_norm.index[(_dias_desde_ingreso >= 0) & (_dias_desde_ingreso < 42)])
 
 # ✅ ADDED: Global filters (Supervisor + Ejecutivo) applied to ALL tables
 st.sidebar.markdown("---")
 st.sidebar.subheader("🔎 Filtros (Supervisor / Ejecutivo)")
 
-_sup_all = (
-    ventas["Supervisor"].replace({None: "", "None": ""}).astype(str).str.strip().replace({"": "BAJA"})
-)
-sup_options = sorted(pd.Series(_sup_all.unique()).dropna().tolist())
+# option lists only change with the loaded range (and the Supervisor pick for ejecutivos);
+# the leading underscore keeps Streamlit from hashing the ventas frame itself
+@st.cache_data(ttl=600, show_spinner=False)
+def _supervisor_options(start_yyyymmdd: str, end_yyyymmdd: str, _ventas: pd.DataFrame) -> list:
+    sup_all = _ventas["Supervisor"].replace({None: "", "None": ""}).astype(str).str.strip().replace({"": "BAJA"})
+    return sorted(pd.Series(sup_all.unique()).dropna().tolist())
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _ejecutivo_options(start_yyyymmdd: str, end_yyyymmdd: str, sup_selected: tuple, _ventas_flt: pd.DataFrame) -> list:
+    return sorted(_ventas_flt["EJECUTIVO"].dropna().unique().tolist())
+
+
+sup_options = _supervisor_options(start_yyyymmdd, end_yyyymmdd, ventas)
 sup_selected = st.sidebar.multiselect(
     "Supervisor",
     options=sup_options,
@@ -787,11 +1121,11 @@ sup_selected = st.sidebar.multiselect(
     key="flt_supervisor_multi",
 )
 
-ventas_flt = ventas.copy()
+ventas_flt = ventas
 if sup_selected:
-    ventas_flt = ventas_flt[ventas_flt["Supervisor"].isin(sup_selected)].copy()
+    ventas_flt = ventas_flt[ventas_flt["Supervisor"].isin(sup_selected)]
 
-ej_options = sorted(ventas_flt["EJECUTIVO"].dropna().unique().tolist())
+ej_options = _ejecutivo_options(start_yyyymmdd, end_yyyymmdd, tuple(sup_selected), ventas_flt)
 ej_selected = st.sidebar.multiselect(
     "Ejecutivo",
     options=ej_options,
@@ -800,7 +1134,7 @@ ej_selected = st.sidebar.multiselect(
 )
 
 if ej_selected:
-    ventas_flt = ventas_flt[ventas_flt["EJECUTIVO"].isin(ej_selected)].copy()
+    ventas_flt = ventas_flt[ventas_flt["EJECUTIVO"].isin(ej_selected)]
 
 # ======================================================
 # ✅ 1) Filtro por MESES + semanas (defaults: últimos 3 meses)
@@ -811,12 +1145,12 @@ st.markdown("## Filtro por meses y semanas")
 if TYPE_CHECKING:
     ventas: pd.DataFrame
 
-df_ctx = ventas_flt.copy()
+df_ctx = ventas_flt
 
 month_map = (
     pd.concat(
         [
-            df_ctx[["T_MonthKey", "T_MonthLabel"]].dropna(),
+            df_ctx[["T_MonthKey", "T_MonthLabel"]].drop_duplicates().dropna(),
             all_months_map[["T_MonthKey", "T_MonthLabel"]].dropna(),
         ],
         ignore_index=True,
@@ -857,16 +1191,23 @@ m_sel = st.multiselect(
     key="tend_mvw_months_multi",
 )
 
-df_f = df_ctx.copy()
 if m_sel:
-    df_f = df_f[df_f["T_MonthLabel"].isin(m_sel)].copy()
+    df_f = df_ctx[df_ctx["T_MonthLabel"].isin(m_sel)]
 else:
-    df_f = df_f.iloc[0:0].copy()
+    df_f = df_ctx.iloc[0:0]
 
-month_start = df_f["T_DT"].dt.to_period("M").dt.to_timestamp()
-first_wd = month_start.dt.weekday
-df_f["T_WeekOfMonth"] = ((df_f["T_DT"].dt.day + first_wd - 1) // 7) + 1
-df_f["T_WeekLabel"] = df_f["T_MonthLabel"] + " - Semana " + df_f["T_WeekOfMonth"].astype(int).astype(str)
+# week of month in plain int64 day arithmetic (1970-01-01 was a Thursday -> weekday 3)
+_day_d = df_f["T_DT"].to_numpy().astype("datetime64[D]")
+_month_d = _day_d.astype("datetime64[M]").astype("datetime64[D]")
+_first_wd = (_month_d.view("i8") + 3) % 7
+_dom = (_day_d - _month_d).view("i8") + 1
+df_f["T_WeekOfMonth"] = ((_dom + _first_wd - 1) // 7) + 1
+
+# label built once per (month, week) pair, then broadcast back (week <= 6, so m * 8 + w is unique)
+_m_codes, _m_uniq = pd.factorize(df_f["T_MonthLabel"])
+_wk_codes, _wk_uniq = pd.factorize(_m_codes * 8 + df_f["T_WeekOfMonth"].to_numpy())
+_wk_labels = np.array([f"{_m_uniq[k // 8]} - Semana {k % 8}" for k in _wk_uniq], dtype=object)
+df_f["T_WeekLabel"] = _wk_labels[_wk_codes]
 
 w_map = (
     df_f[["T_MonthKey", "T_MonthLabel", "T_WeekOfMonth", "T_WeekLabel"]]
@@ -895,9 +1236,9 @@ w_sel = st.multiselect(
 )
 
 if w_sel:
-    df_f = df_f[df_f["T_WeekLabel"].isin(w_sel)].copy()
+    df_f = df_f[df_f["T_WeekLabel"].isin(w_sel)]
 
-df_ctx = df_f.copy()
+df_ctx = df_f
 months_selected_keys = sorted(df_ctx["T_MonthKey"].dropna().unique().tolist())
 
 st.markdown("---")
@@ -912,7 +1253,7 @@ st.markdown("---")
 # ======================================================
 st.markdown("### ⬇️ Exportar Excel — Simulación por Ejecutivo (mes/intervalo actual)")
 
-df_export_base = df_ctx.copy()
+df_export_base = df_ctx
 
 if df_export_base.empty and not empleados.empty:
     pass
@@ -921,212 +1262,251 @@ elif df_export_base.empty:
     st.caption(f"🕒 Render: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
     st.stop()
 
-real_status_map = (
-    empleados.assign(EJ_NORM=empleados["Nombre"].map(normalize_name))
-    .groupby("EJ_NORM")["Estatus"]
-    .first()
-    .to_dict()
+# cached page tables: the key is the filter selection plus a cheap fingerprint of the
+# filtered ventas, so widget reruns that don't touch the data skip the pandas work.
+# df_export_base is ventas_flt narrowed by m_sel/w_sel (already in the key), so only
+# ventas_flt needs hashing.
+def _frame_fingerprint(df: pd.DataFrame) -> tuple:
+    if df.empty:
+        return (df.shape, 0)
+    return (df.shape, int(pd.util.hash_pandas_object(df[["EJECUTIVO", "T_MonthKey"]], index=False).sum()))
+
+
+page_key = (
+    date.today().isoformat(),
+    start_yyyymmdd,
+    end_yyyymmdd,
+    tuple(sup_selected),
+    tuple(ej_selected),
+    tuple(m_sel),
+    tuple(w_sel),
+    _frame_fingerprint(ventas_flt),
 )
 
-months_selected = sorted(df_export_base["T_MonthKey"].dropna().unique().tolist())
-if not months_selected:
-    months_selected = [date.today().strftime("%Y-%m")]
 
-sales_execs_list = df_export_base["EJECUTIVO"].dropna().unique().tolist()
-active_db_emps = empleados[empleados["Estatus"] == "ACTIVO"].copy()
-if sup_selected:
-    active_db_emps = active_db_emps[active_db_emps["Supervisor"].isin(sup_selected)]
+@st.cache_data(ttl=600, show_spinner=False)
+def build_sim_table(
+    key: tuple,
+    include_newbies_meta: bool,
+    sup_selected: tuple,
+    _df_export_base: pd.DataFrame,
+    _empleados: pd.DataFrame,
+    _ingreso_dt_by_norm: pd.Series,
+    _set_nuevos_42d: set,
+):
+    real_status_map = (
+        _empleados.assign(EJ_NORM=normalize_name_series(_empleados["Nombre"]))
+        .groupby("EJ_NORM", observed=True, sort=False)["Estatus"]
+        .first()
+        .to_dict()
+    )
 
-db_execs_list = active_db_emps["Nombre"].unique().tolist()
-execs = sorted(list(set(sales_execs_list + db_execs_list)))
+    months_selected = sorted(_df_export_base["T_MonthKey"].dropna().unique().tolist())
+    if not months_selected:
+        months_selected = [date.today().strftime("%Y-%m")]
+
+    sales_execs_list = _df_export_base["EJECUTIVO"].dropna().unique().tolist()
+    active_db_emps = _empleados[_empleados["Estatus"] == "ACTIVO"]
+    if sup_selected:
+        active_db_emps = active_db_emps[active_db_emps["Supervisor"].isin(sup_selected)]
+
+    db_execs_list = active_db_emps["Nombre"].unique().tolist()
+    execs = sorted(list(set(sales_execs_list + db_execs_list)))
+
+    # keep="last" == the last-wins semantics the per-row to_dict had, on one row per exec
+    sup_map_sales = (
+        _df_export_base[["EJECUTIVO", "Supervisor"]]
+        .dropna(subset=["EJECUTIVO"])
+        .drop_duplicates("EJECUTIVO", keep="last")
+        .set_index("EJECUTIVO")["Supervisor"]
+        .to_dict()
+    )
+    sup_map_db = (
+        _empleados[["Nombre", "Supervisor"]]
+        .dropna(subset=["Nombre"])
+        .drop_duplicates("Nombre", keep="last")
+        .set_index("Nombre")["Supervisor"]
+        .to_dict()
+    )
+    sup_map = {**sup_map_db, **sup_map_sales}
+
+    # (EJECUTIVO, month) pairs are unique after size(): unstack + reindex gives the dense
+    # execs x months matrix directly (zero rows for active execs without sales)
+    df_sim = (
+        _df_export_base.groupby(["EJECUTIVO", "T_MonthKey"], observed=True, sort=False)
+        .size()
+        .unstack("T_MonthKey", fill_value=0)
+        .reindex(index=execs, columns=months_selected, fill_value=0)
+        .rename_axis(index="EJECUTIVO")
+        .reset_index()
+    )
 
-sup_map_sales = (
-    df_export_base[["EJECUTIVO", "Supervisor"]]
-    .dropna(subset=["EJECUTIVO"])
-    .set_index("EJECUTIVO")["Supervisor"]
-    .to_dict()
-)
-sup_map_db = (
-    empleados[["Nombre", "Supervisor"]]
-    .dropna(subset=["Nombre"])
-    .set_index("Nombre")["Supervisor"]
-    .to_dict()
-)
-sup_map = {**sup_map_db, **sup_map_sales}
+    month_cols = months_selected[:]
+    df_sim[month_cols] = df_sim[month_cols].astype(np.int64, copy=False)
 
-df_month_exec = (
-    df_export_base.groupby(["EJECUTIVO", "T_MonthKey"], as_index=False)
-    .size()
-    .rename(columns={"size": "Ventas_mes"})
-)
+    df_sim["Supervisor"] = df_sim["EJECUTIVO"].map(sup_map).fillna("BAJA")
+    df_sim["Total ventas"] = df_sim[month_cols].sum(axis=1).astype(int)
 
-full_idx = pd.MultiIndex.from_product([execs, months_selected], names=["EJECUTIVO", "T_MonthKey"])
-df_month_exec_full = (
-    df_month_exec.set_index(["EJECUTIVO", "T_MonthKey"])
-    .reindex(full_idx, fill_value=0)
-    .reset_index()
-)
+    vals = df_sim[month_cols].to_numpy(dtype=np.int16)
+    avg_active = _avg_ignore_leading_zeros(vals)
+    df_sim["Promedio ventas meses"] = avg_active.astype(float)
 
-df_sim = (
-    df_month_exec_full.pivot_table(
-        index="EJECUTIVO",
-        columns="T_MonthKey",
-        values="Ventas_mes",
-        aggfunc="sum",
-        fill_value=0,
-    )
-    .reset_index()
-)
+    df_sim["EJ_NORM"] = normalize_name_series(df_sim["EJECUTIVO"].astype(str))
+    df_sim["status_db"] = df_sim["EJ_NORM"].map(real_status_map).fillna("UNKNOWN")
 
-for mk in months_selected:
-    if mk not in df_sim.columns:
-        df_sim[mk] = 0
+    last_month_interval = max(month_cols) if month_cols else ""
 
-month_cols = months_selected[:]
-df_sim[month_cols] = df_sim[month_cols].apply(pd.to_numeric, errors="coerce").fillna(0).astype(int)
+    # DB status wins; unknown execs are ACTIVO only with sales in the last month of the interval
+    db_status = df_sim["status_db"].astype(str).str.upper()
+    sales_active = (
+        df_sim[last_month_interval].to_numpy() > 0 if last_month_interval else np.zeros(len(df_sim), dtype=bool)
+    )
+    df_sim["status"] = np.select(
+        [db_status.eq("BAJA"), db_status.eq("ACTIVO"), sales_active],
+        ["BAJA", "ACTIVO", "ACTIVO"],
+        default="BAJA",
+    )
 
-df_sim["Supervisor"] = df_sim["EJECUTIVO"].map(sup_map).fillna("BAJA")
-df_sim["Total ventas"] = df_sim[month_cols].sum(axis=1).astype(int)
+    first_dt_exec = df_sim["EJ_NORM"].map(_ingreso_dt_by_norm)  # already datetime64[ns]
 
-vals = df_sim[month_cols].values.astype(int)
-avg_active = _avg_ignore_leading_zeros(vals)
-df_sim["Promedio ventas meses"] = avg_active.astype(float)
+    if last_month_interval:
+        yy2, mm2 = str(last_month_interval).split("-")
+        ref_day_sim = pd.Timestamp(year=int(yy2), month=int(mm2), day=1).normalize() + pd.DateOffset(months=1)
+    else:
+        ref_day_sim = pd.Timestamp(date.today().year, date.today().month, 1).normalize()
 
-df_sim["EJ_NORM"] = df_sim["EJECUTIVO"].astype(str).map(normalize_name)
-df_sim["status_db"] = df_sim["EJ_NORM"].map(real_status_map).fillna("UNKNOWN")
+    df_sim["dias_activo_al_1ro"] = (
+        (ref_day_sim - first_dt_exec.dt.normalize()).dt.days
+        .fillna(0)
+        .astype(int)
+        .clip(lower=0)
+    )
 
-last_month_interval = max(month_cols) if month_cols else ""
+    prom_sim = df_sim["Promedio ventas meses"].astype(float).values
+    ten_sim = df_sim["dias_activo_al_1ro"].astype(int).values
 
-def resolve_status(row):
-    db_status = str(row["status_db"]).upper()
-    if db_status == "BAJA": return "BAJA"
-    if db_status == "ACTIVO": return "ACTIVO"
-    sales_active = False
-    if last_month_interval and row[last_month_interval] > 0:
-        sales_active = True
-    return "ACTIVO" if sales_active else "BAJA"
+    meta_calc_sim = _meta_from_prom_and_tenure(prom_sim, ten_sim).astype(int)
 
-df_sim["status"] = df_sim.apply(resolve_status, axis=1)
+    # --- meta del mes anterior (para NO BAJAR + semáforo) ---
+    if last_month_interval and len(month_cols) >= 2:
+        ref_prev_day = pd.Timestamp(int(last_month_interval.split("-")[0]), int(last_month_interval.split("-")[1]), 1).normalize()
+        dias_prev = (
+            (ref_prev_day - first_dt_exec.dt.normalize()).dt.days
+            .fillna(0)
+            .astype(int)
+            .clip(lower=0)
+            .values
+        )
 
-first_dt_exec = pd.to_datetime(df_sim["EJ_NORM"].map(_get_ingreso_dt_for_norm), errors="coerce")
+        prev_cols = month_cols[:-1]
+        prev_cols = prev_cols[-3:] if len(prev_cols) > 3 else prev_cols
 
-if last_month_interval:
-    yy2, mm2 = str(last_month_interval).split("-")
-    ref_day_sim = pd.Timestamp(year=int(yy2), month=int(mm2), day=1).normalize() + pd.DateOffset(months=1)
-else:
-    ref_day_sim = pd.Timestamp(date.today().year, date.today().month, 1).normalize()
+        if len(prev_cols) > 0:
+            avg_prev = _avg_ignore_leading_zeros(df_sim[prev_cols].to_numpy(dtype=np.int16))
+        else:
+            avg_prev = prom_sim
 
-df_sim["dias_activo_al_1ro"] = (
-    (ref_day_sim - first_dt_exec.dt.normalize()).dt.days
-    .fillna(0)
-    .astype(int)
-    .clip(lower=0)
-)
+        meta_prev = _meta_from_prom_and_tenure(avg_prev, dias_prev).astype(int)
+    else:
+        meta_prev = meta_calc_sim
 
-prom_sim = df_sim["Promedio ventas meses"].astype(float).values
-ten_sim = df_sim["dias_activo_al_1ro"].astype(int).values
+    # semáforo: rojo si mes anterior > calculada (se iguala), amarillo si igual, verde si sube
+    meta_color_sim = np.where(
+        meta_prev > meta_calc_sim, "ROJO",
+        np.where(meta_prev == meta_calc_sim, "AMARILLO", "VERDE")
+    ).astype(object)
 
-meta_calc_sim = _meta_from_prom_and_tenure(prom_sim, ten_sim).astype(int)
+    meta_final_sim = np.maximum(meta_calc_sim, meta_prev).astype(int)
 
-# --- meta del mes anterior (para NO BAJAR + semáforo) ---
-if last_month_interval and len(month_cols) >= 2:
-    ref_prev_day = pd.Timestamp(int(last_month_interval.split("-")[0]), int(last_month_interval.split("-")[1]), 1).normalize()
-    dias_prev = (
-        (ref_prev_day - first_dt_exec.dt.normalize()).dt.days
-        .fillna(0)
-        .astype(int)
-        .clip(lower=0)
-        .values
-    )
+    # BAJA => meta 0 (y no aplica semáforo)
+    is_baja_sim = (df_sim["status"].astype(str).str.upper() == "BAJA").values
+    meta_final_sim = np.where(is_baja_sim, 0, meta_final_sim).astype(int)
+    meta_color_sim = np.where(is_baja_sim, "", meta_color_sim).astype(object)
 
-    prev_cols = month_cols[:-1]
-    prev_cols = prev_cols[-3:] if len(prev_cols) > 3 else prev_cols
+    df_sim["meta simulacion"] = meta_final_sim.astype(int)
 
-    if len(prev_cols) > 0:
-        avg_prev = _avg_ignore_leading_zeros(df_sim[prev_cols].values.astype(int))
+    # ✅ FIX: Conditional Logic based on Sidebar Toggle (SUMS)
+    if include_newbies_meta:
+        df_sim["meta_for_sum"] = df_sim["meta simulacion"].astype(int)
     else:
-        avg_prev = prom_sim.copy()
-
-    meta_prev = _meta_from_prom_and_tenure(avg_prev, dias_prev).astype(int)
-else:
-    meta_prev = meta_calc_sim.copy()
+        df_sim["meta_for_sum"] = np.where(df_sim["dias_activo_al_1ro"].astype(int) <= 42, 0, df_sim["meta simulacion"].astype(int)).astype(int)
 
-# semáforo: rojo si mes anterior > calculada (se iguala), amarillo si igual, verde si sube
-meta_color_sim = np.where(
-    meta_prev > meta_calc_sim, "ROJO",
-    np.where(meta_prev == meta_calc_sim, "AMARILLO", "VERDE")
-).astype(object)
+    sim_meta_color_map = dict(zip(df_sim["EJECUTIVO"], meta_color_sim.astype(str)))
 
-meta_final_sim = np.maximum(meta_calc_sim, meta_prev).astype(int)
+    meta_total_all = int(df_sim["meta_for_sum"].sum())
 
-# BAJA => meta 0 (y no aplica semáforo)
-is_baja_sim = (df_sim["status"].astype(str).str.upper() == "BAJA").values
-meta_final_sim = np.where(is_baja_sim, 0, meta_final_sim).astype(int)
-meta_color_sim = np.where(is_baja_sim, "", meta_color_sim).astype(object)
+    df_sim["is_nuevo"] = df_sim["EJ_NORM"].isin(_set_nuevos_42d)
 
-df_sim["meta simulacion"] = meta_final_sim.astype(int)
+    df_sim = df_sim[
+        ["EJECUTIVO", "Supervisor", "status", "dias_activo_al_1ro"]
+        + month_cols
+        + ["Total ventas", "Promedio ventas meses", "meta simulacion", "is_nuevo"]
+    ]
 
-# ✅ FIX: Conditional Logic based on Sidebar Toggle (SUMS)
-if include_newbies_meta:
-    df_sim["meta_for_sum"] = df_sim["meta simulacion"].astype(int)
-else:
-    df_sim["meta_for_sum"] = np.where(df_sim["dias_activo_al_1ro"].astype(int) <= 42, 0, df_sim["meta simulacion"].astype(int)).astype(int)
+    # lexsort keys are minor-to-major: Total ventas desc, then Promedio desc (stable, like sort_values)
+    order = np.lexsort((-df_sim["Promedio ventas meses"].to_numpy(), -df_sim["Total ventas"].to_numpy(dtype=np.int64)))
+    df_sim = df_sim.take(order).reset_index(drop=True)
+    sim_is_nuevo = df_sim.pop("is_nuevo").to_numpy(dtype=bool)
 
-sim_meta_color_map = dict(zip(df_sim["EJECUTIVO"], meta_color_sim.astype(str)))
+    lookups = (real_status_map, db_execs_list, sup_map_db, sup_map_sales)
+    return df_sim, sim_is_nuevo, sim_meta_color_map, meta_total_all, months_selected, month_cols, lookups
 
-meta_total_all = int(pd.to_numeric(df_sim["meta_for_sum"], errors="coerce").fillna(0).sum())
-st.markdown(f"**Meta total simulación (todos los ejecutivos, {'incluye' if include_newbies_meta else 'excluye'} meta de nuevos <42d): {meta_total_all:,.0f}**")
 
-df_sim = df_sim[
-    ["EJECUTIVO", "Supervisor", "status", "dias_activo_al_1ro"]
-    + month_cols
-    + ["Total ventas", "Promedio ventas meses", "meta simulacion"]
-].copy()
+df_sim, sim_is_nuevo, sim_meta_color_map, meta_total_all, months_selected, month_cols, exec_lookups = build_sim_table(
+    page_key, include_newbies_meta, tuple(sup_selected), df_export_base, empleados, ingreso_dt_by_norm, set_nuevos_42d
+)
+real_status_map, db_execs_list, sup_map_db, sup_map_sales = exec_lookups
 
-df_sim = df_sim.sort_values(["Total ventas", "Promedio ventas meses"], ascending=False).reset_index(drop=True)
+st.markdown(f"**Meta total simulación (todos los ejecutivos, {'incluye' if include_newbies_meta else 'excluye'} meta de nuevos <42d): {meta_total_all:,.0f}**")
 
 fmt_sim = {c: "{:,.0f}" for c in month_cols + ["dias_activo_al_1ro", "Total ventas", "meta simulacion"]}
 fmt_sim.update({"Promedio ventas meses": "{:,.2f}"})
 
-def highlight_rows_sim(row: pd.Series):
-    styles = [""] * len(row)
+CSS_ROW_BAJA = "background-color: #ff1f3d; color: white; font-weight: 900;"
+CSS_ROW_NUEVO = "background-color: #ffd166; color: black; font-weight: 900;"
+CSS_GAP_ATRASADO = "background-color: #ff1f3d; color: white; font-weight: 900;"
+CSS_TRANSITO = "background-color: #1e90ff; color: white; font-weight: 900;"
+CSS_META_FLAG = {
+    "ROJO": "background-color: #ff1f3d; color: white; font-weight: 900;",
+    "AMARILLO": "background-color: #fff3b0; color: black; font-weight: 900;",
+    "VERDE": "background-color: #2ecc71; color: white; font-weight: 900;",
+}
+
+
+def _meta_flag_css(ejecutivos: pd.Series, color_map: Dict[str, str]) -> np.ndarray:
+    return ejecutivos.map(color_map).map(CSS_META_FLAG).fillna("").to_numpy(dtype=object)
 
-    if row.get("status") == "BAJA":
-        return ["background-color: #ff1f3d; color: white; font-weight: 900;"] * len(row)
 
-    ej = row.get("EJECUTIVO")
-    ej_norm = normalize_name(ej)
+# sim_is_nuevo: nuevo-ingreso flag per display row (df_sim has a RangeIndex)
+
+def highlight_rows_sim(df: pd.DataFrame) -> pd.DataFrame:
+    # whole-table styler (Styler.apply axis=None): one call, masks instead of per-row Python
+    styles = np.full(df.shape, "", dtype=object)
 
     # nuevos ingresos -> fila amarilla
-    if ej_norm in set_nuevos_42d:
-        styles = ["background-color: #ffd166; color: black; font-weight: 900;"] * len(row)
+    styles[sim_is_nuevo] = CSS_ROW_NUEVO
 
     # semáforo meta simulación -> solo celda meta
-    flag = sim_meta_color_map.get(ej, "")
-    if flag == "ROJO":
-        meta_style = "background-color: #ff1f3d; color: white; font-weight: 900;"
-    elif flag == "AMARILLO":
-        meta_style = "background-color: #fff3b0; color: black; font-weight: 900;"
-    elif flag == "VERDE":
-        meta_style = "background-color: #2ecc71; color: white; font-weight: 900;"
-    else:
-        meta_style = ""
+    if "meta simulacion" in df.columns:
+        meta_css = _meta_flag_css(df["EJECUTIVO"], sim_meta_color_map)
+        has_flag = meta_css != ""
+        styles[has_flag, df.columns.get_loc("meta simulacion")] = meta_css[has_flag]
 
-    if meta_style and "meta simulacion" in row.index:
-        styles[row.index.get_loc("meta simulacion")] = meta_style
+    # BAJA -> fila roja completa (gana sobre todo lo demás)
+    styles[(df["status"] == "BAJA").to_numpy(dtype=bool)] = CSS_ROW_BAJA
 
-    return styles
+    return pd.DataFrame(styles, index=df.index, columns=df.columns)
 
 st.dataframe(
-    df_sim.style.apply(highlight_rows_sim, axis=1).format(fmt_sim),
+    df_sim.style.apply(highlight_rows_sim, axis=None).format(fmt_sim),
     hide_index=True,
     width="stretch",
 )
 
-excel_bytes_sim = _to_excel_bytes(
-    df_sim,
-    "Simulacion_Ejecutivos",
-    style_fn=lambda ws, df: _style_simulacion_excel(ws, df, set_nuevos_42d, sim_meta_color_map),
+excel_bytes_sim = partial(
+    _excel_bytes_on_download,
+    {"Simulacion_Ejecutivos": df_sim},
+    {"Simulacion_Ejecutivos": partial(_style_simulacion_excel, is_nuevo=sim_is_nuevo, meta_color_map=sim_meta_color_map)},
 )
 fname = (
     f"simulacion_ejecutivos_{months_selected[0]}.xlsx"
@@ -1173,261 +1553,231 @@ meta_window_keys = meta_month_options[max(0, meta_idx - 3) : meta_idx]  # 👈 e
 if len(meta_window_keys) == 0:
     meta_window_keys = meta_month_options[max(0, meta_idx - 2) : meta_idx + 1]
 
-df_meta_base = ventas_flt[ventas_flt["T_MonthKey"].isin(meta_window_keys)].copy()
+@st.cache_data(ttl=600, show_spinner=False)
+def build_metas_table(
+    key: tuple,
+    meta_month_key: str,
+    meta_window_keys: list,
+    meta_month_options: list,
+    include_newbies_meta: bool,
+    _ventas_flt: pd.DataFrame,
+    _exec_lookups: tuple,
+    _ingreso_dt_by_norm: pd.Series,
+    _set_nuevos_42d: set,
+):
+    real_status_map, db_execs_list, sup_map_db, sup_map_sales = _exec_lookups
+
+    df_meta_base = _ventas_flt[_ventas_flt["T_MonthKey"].isin(meta_window_keys)]
+
+    sales_meta_execs = df_meta_base["EJECUTIVO"].dropna().unique().tolist()
+    meta_execs = sorted(list(set(sales_meta_execs + db_execs_list)))
+
+    sup_map_metas = {**sup_map_db, **sup_map_sales}
+
+    centro_map = (
+        _ventas_flt[["EJECUTIVO", "CentroKey"]]
+        .dropna(subset=["EJECUTIVO"])
+        .drop_duplicates("EJECUTIVO", keep="last")
+        .set_index("EJECUTIVO")["CentroKey"]
+        .to_dict()
+    )
 
-sales_meta_execs = df_meta_base["EJECUTIVO"].dropna().unique().tolist()
-meta_execs = sorted(list(set(sales_meta_execs + db_execs_list)))
+    df_metas = (
+        df_meta_base.groupby(["EJECUTIVO", "T_MonthKey"], observed=True, sort=False)
+        .size()
+        .unstack("T_MonthKey", fill_value=0)
+        .reindex(index=meta_execs, columns=meta_window_keys, fill_value=0)
+        .rename_axis(index="EJECUTIVO")
+        .reset_index()
+    )
 
-sup_map_metas = {**sup_map_db, **sup_map_sales}
+    # categorical group keys for the team/centro aggregates and sanity groupbys
+    # (lexically ordered categories, so the key tiebreaks in those sorts are unchanged)
+    df_metas["Supervisor"] = df_metas["EJECUTIVO"].map(sup_map_metas).fillna("BAJA").astype("category")
+    df_metas["CentroKey"] = pd.Categorical(df_metas["EJECUTIVO"].map(centro_map).fillna("CC2"), categories=["CC2", "JV"])
 
-centro_map = (
-    ventas_flt[["EJECUTIVO", "CentroKey"]]
-    .dropna(subset=["EJECUTIVO"])
-    .set_index("EJECUTIVO")["CentroKey"]
-    .to_dict()
-)
+    df_metas["EJ_NORM"] = normalize_name_series(df_metas["EJECUTIVO"].astype(str))
+    df_metas["status_db"] = df_metas["EJ_NORM"].map(real_status_map).fillna("UNKNOWN")
 
-df_meta_me = (
-    df_meta_base.groupby(["EJECUTIVO", "T_MonthKey"], as_index=False)
-    .size()
-    .rename(columns={"size": "Ventas_mes"})
-)
+    df_metas["is_active"] = df_metas["status_db"].astype(str).str.upper().eq("ACTIVO")
+    df_metas = df_metas[df_metas["is_active"]]
 
-full_idx2 = pd.MultiIndex.from_product([meta_execs, meta_window_keys], names=["EJECUTIVO", "T_MonthKey"])
-df_meta_full = (
-    df_meta_me.set_index(["EJECUTIVO", "T_MonthKey"])
-    .reindex(full_idx2, fill_value=0)
-    .reset_index()
-)
+    if df_metas.empty:
+        return None, []
 
-df_metas = (
-    df_meta_full.pivot_table(
-        index="EJECUTIVO",
-        columns="T_MonthKey",
-        values="Ventas_mes",
-        aggfunc="sum",
-        fill_value=0,
-    )
-    .reset_index()
-)
+    df_metas["status"] = "ACTIVO"
 
-for mk in meta_window_keys:
-    if mk not in df_metas.columns:
-        df_metas[mk] = 0
+    yy, mm = meta_month_key.split("-")
+    ref_day = pd.Timestamp(year=int(yy), month=int(mm), day=1).normalize()
 
-df_metas["Supervisor"] = df_metas["EJECUTIVO"].map(sup_map_metas).fillna("BAJA")
-df_metas["CentroKey"] = df_metas["EJECUTIVO"].map(centro_map).fillna("CC2")
+    fd = df_metas["EJ_NORM"].map(_ingreso_dt_by_norm)
+    # .dt.days is float only because of NaT; no inf/strings can appear here
+    tenure_days = (ref_day - fd.dt.normalize()).dt.days.fillna(0).astype(int).clip(lower=0)
+    df_metas["dias_activo_al_1ro"] = tenure_days.astype(int)
 
-df_metas["EJ_NORM"] = df_metas["EJECUTIVO"].astype(str).map(normalize_name)
-df_metas["status_db"] = df_metas["EJ_NORM"].map(real_status_map).fillna("UNKNOWN")
+    # PROMEDIO: 3 meses o 2 si <90 días
+    last3_cols = meta_window_keys[:]
+    last2_cols = last3_cols[-2:] if len(last3_cols) >= 2 else last3_cols
 
-def is_active_for_metas(row):
-    st_db = str(row["status_db"]).upper()
-    if st_db == "ACTIVO": return True
-    if st_db == "BAJA": return False
-    return False
+    if not last3_cols:
+        avg3 = np.zeros(len(df_metas), dtype=float)
+    else:
+        avg3 = _avg_ignore_leading_zeros(df_metas[last3_cols].to_numpy(dtype=np.int16))
 
-df_metas["is_active"] = df_metas.apply(is_active_for_metas, axis=1)
-df_metas = df_metas[df_metas["is_active"]].copy()
+    if not last2_cols:
+        avg2 = avg3
+    else:
+        avg2 = _avg_ignore_leading_zeros(df_metas[last2_cols].to_numpy(dtype=np.int16))
 
-if df_metas.empty:
-    st.info("No hay ejecutivos activos en el mes seleccionado para metas.")
-    st.caption(f"🕒 Render: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
-    st.stop()
+    use_2m = df_metas["dias_activo_al_1ro"].astype(int) < 90
+    prom_used = np.where(use_2m, avg2, avg3).astype(float)
+    df_metas["prom_ult_3m"] = prom_used
 
-df_metas["status"] = "ACTIVO"
+    prom = df_metas["prom_ult_3m"].astype(float).values
+    ten = df_metas["dias_activo_al_1ro"].astype(int).values
 
-yy, mm = meta_month_key.split("-")
-ref_day = pd.Timestamp(year=int(yy), month=int(mm), day=1).normalize()
+    meta_calc = _meta_from_prom_and_tenure(prom, ten)
+    df_metas["meta_mes_calculada"] = meta_calc.astype(int)
 
-fd = pd.to_datetime(df_metas["EJ_NORM"].map(_get_ingreso_dt_for_norm), errors="coerce")
-tenure_days = (ref_day - fd.dt.normalize()).dt.days
-tenure_days = (
-    pd.to_numeric(tenure_days, errors="coerce")
-    .replace([np.inf, -np.inf], np.nan)
-    .fillna(0)
-    .astype(int)
-    .clip(lower=0)
-)
-df_metas["dias_activo_al_1ro"] = tenure_days.astype(int)
+    # META MES ANTERIOR (para comparación y piso)
+    prev_month_key = (ref_day - pd.DateOffset(months=1)).strftime("%Y-%m")
+    df_metas["meta_mes_anterior"] = df_metas["meta_mes_calculada"].astype(int)
 
-# PROMEDIO: 3 meses o 2 si <90 días
-last3_cols = meta_window_keys[:]
-last2_cols = last3_cols[-2:] if len(last3_cols) >= 2 else last3_cols
+    if prev_month_key in meta_month_options:
+        prev_idx = meta_month_options.index(prev_month_key)
+        prev_window_keys = meta_month_options[max(0, prev_idx - 3) : prev_idx]
 
-if not last3_cols:
-    avg3 = np.zeros(len(df_metas), dtype=float)
-else:
-    avg3 = _avg_ignore_leading_zeros(df_metas[last3_cols].values.astype(int))
+        if len(prev_window_keys) == 0:
+            prev_window_keys = meta_month_options[max(0, prev_idx - 2) : prev_idx + 1]
 
-if not last2_cols:
-    avg2 = avg3.copy()
-else:
-    avg2 = _avg_ignore_leading_zeros(df_metas[last2_cols].values.astype(int))
+        prev_execs = df_metas["EJECUTIVO"].dropna().unique().tolist()
 
-use_2m = df_metas["dias_activo_al_1ro"].astype(int) < 90
-prom_used = np.where(use_2m, avg2, avg3).astype(float)
-df_metas["prom_ult_3m"] = prom_used
+        if len(prev_window_keys) > 0 and len(prev_execs) > 0:
+            df_prev_base = _ventas_flt[_ventas_flt["T_MonthKey"].isin(prev_window_keys)]
 
-prom = df_metas["prom_ult_3m"].astype(float).values
-ten = df_metas["dias_activo_al_1ro"].astype(int).values
+            df_prev_pvt = (
+                df_prev_base.groupby(["EJECUTIVO", "T_MonthKey"], observed=True, sort=False)
+                .size()
+                .unstack("T_MonthKey", fill_value=0)
+                .reindex(index=sorted(prev_execs), columns=prev_window_keys, fill_value=0)
+                .rename_axis(index="EJECUTIVO")
+                .reset_index()
+            )
 
-meta_calc = _meta_from_prom_and_tenure(prom, ten)
-df_metas["meta_mes_calculada"] = meta_calc.astype(int)
+            df_prev_pvt["EJ_NORM"] = normalize_name_series(df_prev_pvt["EJECUTIVO"].astype(str))
 
-# META MES ANTERIOR (para comparación y piso)
-prev_month_key = (ref_day - pd.DateOffset(months=1)).strftime("%Y-%m")
-df_metas["meta_mes_anterior"] = df_metas["meta_mes_calculada"].astype(int)
+            ypm, mpm = prev_month_key.split("-")
+            ref_prev_day = pd.Timestamp(year=int(ypm), month=int(mpm), day=1).normalize()
 
-if prev_month_key in meta_month_options:
-    prev_idx = meta_month_options.index(prev_month_key)
-    prev_window_keys = meta_month_options[max(0, prev_idx - 3) : prev_idx]
+            fd_prev = df_prev_pvt["EJ_NORM"].map(_ingreso_dt_by_norm)
+            ten_prev = (ref_prev_day - fd_prev.dt.normalize()).dt.days.fillna(0).astype(int).clip(lower=0).values
 
-    if len(prev_window_keys) == 0:
-        prev_window_keys = meta_month_options[max(0, prev_idx - 2) : prev_idx + 1]
+            prev3_cols = prev_window_keys[:]
+            prev2_cols = prev3_cols[-2:] if len(prev3_cols) >= 2 else prev3_cols
 
-    prev_execs = df_metas["EJECUTIVO"].dropna().unique().tolist()
+            if not prev3_cols:
+                avg3_prev = np.zeros(len(df_prev_pvt), dtype=float)
+            else:
+                avg3_prev = _avg_ignore_leading_zeros(df_prev_pvt[prev3_cols].to_numpy(dtype=np.int16))
 
-    if len(prev_window_keys) > 0 and len(prev_execs) > 0:
-        df_prev_base = ventas_flt[ventas_flt["T_MonthKey"].isin(prev_window_keys)].copy()
+            if not prev2_cols:
+                avg2_prev = avg3_prev
+            else:
+                avg2_prev = _avg_ignore_leading_zeros(df_prev_pvt[prev2_cols].to_numpy(dtype=np.int16))
 
-        df_prev_me = (
-            df_prev_base.groupby(["EJECUTIVO", "T_MonthKey"], as_index=False)
-            .size()
-            .rename(columns={"size": "Ventas_mes"})
-        )
+            use_2m_prev = (ten_prev < 90)
+            prom_prev_used = np.where(use_2m_prev, avg2_prev, avg3_prev).astype(float)
 
-        full_idx_prev = pd.MultiIndex.from_product([prev_execs, prev_window_keys], names=["EJECUTIVO", "T_MonthKey"])
-        df_prev_full = (
-            df_prev_me.set_index(["EJECUTIVO", "T_MonthKey"])
-            .reindex(full_idx_prev, fill_value=0)
-            .reset_index()
-        )
+            meta_prev = _meta_from_prom_and_tenure(prom_prev_used, ten_prev).astype(int)
+            prev_meta_map = dict(zip(df_prev_pvt["EJECUTIVO"], meta_prev))
 
-        df_prev_pvt = (
-            df_prev_full.pivot_table(
-                index="EJECUTIVO",
-                columns="T_MonthKey",
-                values="Ventas_mes",
-                aggfunc="sum",
-                fill_value=0,
+            df_metas["meta_mes_anterior"] = (
+                df_metas["EJECUTIVO"].map(prev_meta_map)
+                .fillna(df_metas["meta_mes_calculada"])
+                .astype(int)
             )
-            .reset_index()
-        )
 
-        for mk in prev_window_keys:
-            if mk not in df_prev_pvt.columns:
-                df_prev_pvt[mk] = 0
+    prev_meta_vals = df_metas["meta_mes_anterior"].astype(int).values
+    calc_meta_vals = df_metas["meta_mes_calculada"].astype(int).values
 
-        df_prev_pvt["EJ_NORM"] = df_prev_pvt["EJECUTIVO"].astype(str).map(normalize_name)
-
-        ypm, mpm = prev_month_key.split("-")
-        ref_prev_day = pd.Timestamp(year=int(ypm), month=int(mpm), day=1).normalize()
-
-        fd_prev = pd.to_datetime(df_prev_pvt["EJ_NORM"].map(_get_ingreso_dt_for_norm), errors="coerce")
-        ten_prev = (ref_prev_day - fd_prev.dt.normalize()).dt.days
-        ten_prev = (
-            pd.to_numeric(ten_prev, errors="coerce")
-            .replace([np.inf, -np.inf], np.nan)
-            .fillna(0)
-            .astype(int)
-            .clip(lower=0)
-            .values
-        )
+    df_metas["meta_color"] = np.where(
+        prev_meta_vals > calc_meta_vals, "ROJO",
+        np.where(prev_meta_vals == calc_meta_vals, "AMARILLO", "VERDE")
+    )
 
-        prev3_cols = prev_window_keys[:]
-        prev2_cols = prev3_cols[-2:] if len(prev3_cols) >= 2 else prev3_cols
+    meta_final = np.maximum(calc_meta_vals, prev_meta_vals).astype(int)
+    df_metas["meta_mes_actual"] = meta_final.astype(int)
 
-        if not prev3_cols:
-            avg3_prev = np.zeros(len(df_prev_pvt), dtype=float)
-        else:
-            avg3_prev = _avg_ignore_leading_zeros(df_prev_pvt[prev3_cols].values.astype(int))
+    if include_newbies_meta:
+        df_metas["meta_for_sum"] = df_metas["meta_mes_actual"].astype(int)
+    else:
+        df_metas["meta_for_sum"] = np.where(df_metas["dias_activo_al_1ro"].astype(int) <= 42, 0, df_metas["meta_mes_actual"].astype(int)).astype(int)
 
-        if not prev2_cols:
-            avg2_prev = avg3_prev.copy()
-        else:
-            avg2_prev = _avg_ignore_leading_zeros(df_prev_pvt[prev2_cols].values.astype(int))
+    df_metas["is_nuevo"] = df_metas["EJ_NORM"].isin(_set_nuevos_42d)
 
-        use_2m_prev = (ten_prev < 90)
-        prom_prev_used = np.where(use_2m_prev, avg2_prev, avg3_prev).astype(float)
+    df_metas_view = df_metas[
+        ["EJECUTIVO", "Supervisor", "CentroKey", "status", "dias_activo_al_1ro"]
+        + last3_cols
+        + ["prom_ult_3m", "meta_mes_anterior", "meta_mes_calculada", "meta_mes_actual", "meta_for_sum", "meta_color", "is_nuevo", "EJ_NORM"]
+    ]
 
-        meta_prev = _meta_from_prom_and_tenure(prom_prev_used, ten_prev).astype(int)
-        prev_meta_map = dict(zip(df_prev_pvt["EJECUTIVO"], meta_prev))
+    df_metas_view = df_metas_view.sort_values(
+        ["meta_mes_actual", "prom_ult_3m"],
+        ascending=[False, False],
+    ).reset_index(drop=True)
 
-        df_metas["meta_mes_anterior"] = (
-            df_metas["EJECUTIVO"].map(prev_meta_map)
-            .fillna(df_metas["meta_mes_calculada"])
-            .astype(int)
-        )
+    return df_metas_view, last3_cols
 
-prev_meta_vals = df_metas["meta_mes_anterior"].astype(int).values
-calc_meta_vals = df_metas["meta_mes_calculada"].astype(int).values
 
-df_metas["meta_color"] = np.where(
-    prev_meta_vals > calc_meta_vals, "ROJO",
-    np.where(prev_meta_vals == calc_meta_vals, "AMARILLO", "VERDE")
+df_metas_view, last3_cols = build_metas_table(
+    page_key,
+    meta_month_key,
+    meta_window_keys,
+    meta_month_options,
+    include_newbies_meta,
+    ventas_flt,
+    exec_lookups,
+    ingreso_dt_by_norm,
+    set_nuevos_42d,
 )
 
-meta_final = np.maximum(calc_meta_vals, prev_meta_vals).astype(int)
-df_metas["meta_mes_actual"] = meta_final.astype(int)
-
-if include_newbies_meta:
-    df_metas["meta_for_sum"] = df_metas["meta_mes_actual"].astype(int)
-else:
-    df_metas["meta_for_sum"] = np.where(df_metas["dias_activo_al_1ro"].astype(int) <= 42, 0, df_metas["meta_mes_actual"].astype(int)).astype(int)
-
-df_metas_view = df_metas[
-    ["EJECUTIVO", "Supervisor", "CentroKey", "status", "dias_activo_al_1ro"]
-    + last3_cols
-    + ["prom_ult_3m", "meta_mes_anterior", "meta_mes_calculada", "meta_mes_actual", "meta_for_sum", "meta_color"]
-].copy()
+if df_metas_view is None:
+    st.info("No hay ejecutivos activos en el mes seleccionado para metas.")
+    st.caption(f"🕒 Render: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+    st.stop()
 
-df_metas_view = df_metas_view.sort_values(
-    ["meta_mes_actual", "prom_ult_3m"],
-    ascending=[False, False],
-).reset_index(drop=True)
 
 fmt_metas = {c: "{:,.0f}" for c in last3_cols + ["dias_activo_al_1ro", "meta_mes_anterior", "meta_mes_calculada", "meta_mes_actual"]}
 fmt_metas.update({"prom_ult_3m": "{:,.2f}"})
 
 meta_color_map = dict(zip(df_metas_view["EJECUTIVO"], df_metas_view["meta_color"]))
 
-def highlight_metas(row: pd.Series):
-    styles = [""] * len(row)
-
-    ej = row.get("EJECUTIVO")
-    ej_norm = normalize_name(ej)
+metas_is_nuevo = df_metas_view["is_nuevo"].to_numpy(dtype=bool)
 
-    if ej_norm in set_nuevos_42d:
-        styles = ["background-color: #ffd166; color: black; font-weight: 900;"] * len(row)
+def highlight_metas(df: pd.DataFrame) -> pd.DataFrame:
+    styles = np.full(df.shape, "", dtype=object)
 
-    flag = meta_color_map.get(ej, "")
-    if flag == "ROJO":
-        meta_style = "background-color: #ff1f3d; color: white; font-weight: 900;"
-    elif flag == "AMARILLO":
-        meta_style = "background-color: #fff3b0; color: black; font-weight: 900;"
-    elif flag == "VERDE":
-        meta_style = "background-color: #2ecc71; color: white; font-weight: 900;"
-    else:
-        meta_style = ""
+    styles[metas_is_nuevo] = CSS_ROW_NUEVO
 
-    if "meta_mes_actual" in row.index and meta_style:
-        styles[row.index.get_loc("meta_mes_actual")] = meta_style
+    if "meta_mes_actual" in df.columns:
+        meta_css = _meta_flag_css(df["EJECUTIVO"], meta_color_map)
+        has_flag = meta_css != ""
+        styles[has_flag, df.columns.get_loc("meta_mes_actual")] = meta_css[has_flag]
 
-    return styles
+    return pd.DataFrame(styles, index=df.index, columns=df.columns)
 
-df_metas_show = df_metas_view.drop(columns=["meta_for_sum", "meta_color"]).copy()
+df_metas_show = df_metas_view.drop(columns=["meta_for_sum", "meta_color", "is_nuevo", "EJ_NORM"])
 
 st.dataframe(
-    df_metas_show.style.apply(highlight_metas, axis=1).format(fmt_metas),
+    df_metas_show.style.apply(highlight_metas, axis=None).format(fmt_metas),
     hide_index=True,
     width="stretch",
 )
 
-excel_bytes_metas = _to_excel_bytes(
-    df_metas_show,
-    "Metas_Mes",
-    style_fn=lambda ws, df: _style_metas_excel(ws, df, set_nuevos_42d, meta_color_map),
+excel_bytes_metas = partial(
+    _excel_bytes_on_download,
+    {"Metas_Mes": df_metas_show},
+    {"Metas_Mes": partial(_style_metas_excel, is_nuevo=metas_is_nuevo, meta_color_map=meta_color_map)},
 )
 st.download_button(
     "⬇️ Descargar Excel (Metas mes seleccionado)",
@@ -1443,52 +1793,62 @@ st.download_button(
 st.markdown("---")
 st.markdown("### 📌 Metas agregadas: por Team (Supervisor), por Centro y Global")
 
-df_team = (
-    df_metas_view.groupby(["Supervisor"], as_index=False)
-    .agg(
-        ejecutivos=("EJECUTIVO", "nunique"),
-        meta_team=("meta_for_sum", "sum"),
-        promedio_meta=("meta_mes_actual", "mean"),
+@st.cache_data(ttl=600, show_spinner=False)
+def build_aggregates(key: tuple, meta_month_key: str, include_newbies_meta: bool, _df_metas_view: pd.DataFrame):
+    df_team = (
+        _df_metas_view.groupby(["Supervisor"], as_index=False, observed=True, sort=False)
+        .agg(
+            ejecutivos=("EJECUTIVO", "nunique"),
+            meta_team=("meta_for_sum", "sum"),
+            promedio_meta=("meta_mes_actual", "mean"),
+        )
     )
-)
-df_team["promedio_meta"] = df_team["promedio_meta"].astype(float)
-df_team = df_team.sort_values(["meta_team", "ejecutivos"], ascending=[False, False]).reset_index(drop=True)
+    df_team["promedio_meta"] = df_team["promedio_meta"].astype(float)
+    df_team = df_team.sort_values(["meta_team", "ejecutivos", "Supervisor"], ascending=[False, False, True]).reset_index(drop=True)
+
+    df_centro = (
+        _df_metas_view.groupby(["CentroKey"], as_index=False, observed=True, sort=False)
+        .agg(
+            ejecutivos=("EJECUTIVO", "nunique"),
+            meta_centro=("meta_for_sum", "sum"),
+            promedio_meta=("meta_mes_actual", "mean"),
+        )
+    )
+    df_centro["promedio_meta"] = df_centro["promedio_meta"].astype(float)
+    df_centro = df_centro.sort_values(["meta_centro", "ejecutivos", "CentroKey"], ascending=[False, False, True]).reset_index(drop=True)
+
+    meta_arr = _df_metas_view["meta_mes_actual"].to_numpy(dtype=np.int64)
+    n_meta = meta_arr.size
+    df_global = pd.DataFrame(
+        [{
+            "mes": meta_month_key,
+            "ejecutivos_activos": int(_df_metas_view["EJECUTIVO"].nunique()),
+            "meta_global": int(_df_metas_view["meta_for_sum"].to_numpy().sum()),
+            "promedio_meta": float(meta_arr.sum() / n_meta) if n_meta else 0.0,
+        }]
+    )
+    return df_team, df_centro, df_global
+
+
+df_team, df_centro, df_global = build_aggregates(page_key, meta_month_key, include_newbies_meta, df_metas_view)
 
 fmt_team = {"ejecutivos": "{:,.0f}", "meta_team": "{:,.0f}", "promedio_meta": "{:,.2f}"}
 
 st.markdown("#### 🧩 Meta por Team (Supervisor)")
 st.dataframe(df_team.style.format(fmt_team), hide_index=True, width="stretch")
 
-df_centro = (
-    df_metas_view.groupby(["CentroKey"], as_index=False)
-    .agg(
-        ejecutivos=("EJECUTIVO", "nunique"),
-        meta_centro=("meta_for_sum", "sum"),
-        promedio_meta=("meta_mes_actual", "mean"),
-    )
-)
-df_centro["promedio_meta"] = df_centro["promedio_meta"].astype(float)
-df_centro = df_centro.sort_values(["meta_centro", "ejecutivos"], ascending=[False, False]).reset_index(drop=True)
-
 fmt_centro = {"ejecutivos": "{:,.0f}", "meta_centro": "{:,.0f}", "promedio_meta": "{:,.2f}"}
 
 st.markdown("#### 🏢 Meta por Centro (JV / CC2)")
 st.dataframe(df_centro.style.format(fmt_centro), hide_index=True, width="stretch")
 
-df_global = pd.DataFrame(
-    [{
-        "mes": meta_month_key,
-        "ejecutivos_activos": int(df_metas_view["EJECUTIVO"].nunique()),
-        "meta_global": int(df_metas_view["meta_for_sum"].sum()),
-        "promedio_meta": float(df_metas_view["meta_mes_actual"].mean()) if len(df_metas_view) else 0.0,
-    }]
-)
 fmt_global = {"ejecutivos_activos": "{:,.0f}", "meta_global": "{:,.0f}", "promedio_meta": "{:,.2f}"}
 
 st.markdown("#### 🌎 Meta Global")
 st.dataframe(df_global.style.format(fmt_global), hide_index=True, width="stretch")
 
-metas_agregadas_xlsx = _to_excel_bytes_multi(
+metas_agregadas_xlsx = partial(
+    _excel_bytes_on_download,
     {
         "Meta_por_Team": df_team,
         "Meta_por_Centro": df_centro,
@@ -1516,8 +1876,12 @@ def _nth_weekday_of_month(year: int, month: int, weekday: int, n: int) -> date:
     d = d.replace(day=d.day + 7 * (n - 1))
     return d
 
-def mexico_puentes(year: int) -> set:
-    return {
+# calendar helpers are pure functions of their (hashable) arguments. lru_cache dedupes the
+# repeated calls within a run (the script body, and so these functions, is re-created on
+# every rerun); workable_day_counts() below persists the results across reruns.
+@lru_cache(maxsize=64)
+def mexico_puentes(year: int) -> frozenset:
+    return frozenset({
         date(year, 1, 1),
         _nth_weekday_of_month(year, 2, 0, 1),
         _nth_weekday_of_month(year, 3, 0, 3),
@@ -1525,30 +1889,38 @@ def mexico_puentes(year: int) -> set:
         date(year, 9, 16),
         _nth_weekday_of_month(year, 11, 0, 3),
         date(year, 12, 25),
-    }
+    })
+
+@lru_cache(maxsize=16)
+def _puentes_array(year_lo: int, year_hi: int) -> np.ndarray:
+    # sorted datetime64[D] holidays for every year in [year_lo, year_hi], built once per span
+    puentes = frozenset().union(*(mexico_puentes(y) for y in range(year_lo, year_hi + 1)))
+    arr = np.array(sorted(puentes), dtype="datetime64[D]")
+    arr.setflags(write=False)  # shared through the cache
+    return arr
+
+@lru_cache(maxsize=16)
+def _busdaycals(year_lo: int, year_hi: int) -> tuple:
+    # (Mon-Fri, Sat-only) calendars sharing the span's puentes; busday_count reuses them
+    holidays = _puentes_array(year_lo, year_hi)
+    return (
+        np.busdaycalendar(weekmask="1111100", holidays=holidays),
+        np.busdaycalendar(weekmask="0000010", holidays=holidays),
+    )
 
+@lru_cache(maxsize=256)
 def workable_equiv_between(start_d: date, end_d: date) -> float:
+    # Mon-Fri = 1 day, Sat = 1/2 day, puentes MX (any year in the span) excluded
     if end_d < start_d:
         return 0.0
-    days = pd.date_range(pd.Timestamp(start_d), pd.Timestamp(end_d), freq="D")
-    puentes = mexico_puentes(start_d.year)
-    total = 0.0
-    for dts in days:
-        d = dts.date()
-        if dts.year != start_d.year:
-            puentes = puentes | mexico_puentes(dts.year)
-
-        if d in puentes:
-            continue
-        wd = dts.weekday()
-        if wd <= 4:
-            total += 1.0
-        elif wd == 5:
-            total += 0.5
-        else:
-            continue
-    return float(total)
-
+    cal_weekdays, cal_saturdays = _busdaycals(start_d.year, end_d.year)
+    d0 = np.datetime64(start_d, "D")
+    d1 = np.datetime64(end_d, "D") + 1
+    weekdays = np.busday_count(d0, d1, busdaycal=cal_weekdays)
+    saturdays = np.busday_count(d0, d1, busdaycal=cal_saturdays)
+    return float(weekdays + 0.5 * saturdays)
+
+@lru_cache(maxsize=64)
 def month_bounds(ym_key: str):
     y, m = ym_key.split("-")
     y = int(y)
@@ -1557,10 +1929,12 @@ def month_bounds(ym_key: str):
     end = (pd.Timestamp(y, m, 1) + pd.offsets.MonthEnd(1)).date()
     return start, end
 
+@lru_cache(maxsize=64)
 def workable_days_equiv_month(ym_key: str) -> float:
     start, end = month_bounds(ym_key)
     return workable_equiv_between(start, end)
 
+@lru_cache(maxsize=256)
 def workable_days_equiv_elapsed_in_month(ym_key: str, today: date) -> float:
     start, end = month_bounds(ym_key)
     if today < start:
@@ -1568,13 +1942,19 @@ def workable_days_equiv_elapsed_in_month(ym_key: str, today: date) -> float:
     cutoff = min(today, end)
     return workable_equiv_between(start, cutoff)
 
-dias_hab_eq_total = workable_days_equiv_month(meta_month_key)
-dias_hab_eq_elapsed = workable_days_equiv_elapsed_in_month(meta_month_key, date.today())
+@st.cache_data(ttl=3600, show_spinner=False)
+def workable_day_counts(ym_key: str, today_iso: str) -> tuple:
+    """(total, elapsed, remaining) workable-equivalent days of ym_key as of today_iso."""
+    today_d = date.fromisoformat(today_iso)
+    m_ini, m_fin = month_bounds(ym_key)
+    total = workable_days_equiv_month(ym_key)
+    elapsed = workable_days_equiv_elapsed_in_month(ym_key, today_d)
+    start_rem = today_d if today_d > m_ini else m_ini
+    remaining = workable_equiv_between(start_rem, m_fin) if today_d <= m_fin else 0.0
+    return total, elapsed, remaining
 
-m_ini_tmp, m_fin_tmp = month_bounds(meta_month_key)
 today_d = date.today()
-start_rem = today_d if today_d > m_ini_tmp else m_ini_tmp
-dias_hab_eq_remaining = workable_equiv_between(start_rem, m_fin_tmp) if today_d <= m_fin_tmp else 0.0
+dias_hab_eq_total, dias_hab_eq_elapsed, dias_hab_eq_remaining = workable_day_counts(meta_month_key, today_d.isoformat())
 
 dias_hab_eq_remaining_for_rate = float(dias_hab_eq_remaining)
 if 0.0 < dias_hab_eq_remaining_for_rate < 1.0:
@@ -1583,52 +1963,62 @@ if 0.0 < dias_hab_eq_remaining_for_rate < 1.0:
 if dias_hab_eq_total <= 0:
     st.info("No se pudieron calcular días laborables equivalentes para el mes seleccionado.")
 else:
-    df_sanity_exec = df_metas_view.copy()
+    df_sanity_exec = df_metas_view.copy(deep=False)
+    # Supervisor / CentroKey are already categorical; EJECUTIVO only feeds nunique() and
+    # the al_corriente lookup here, both of which run on the codes
+    df_sanity_exec["EJECUTIVO"] = df_sanity_exec["EJECUTIVO"].astype("category")
 
     try:
         m_ini, m_fin = month_bounds(meta_month_key)
         prog_split = load_programadas_split_by_exec(m_ini.strftime("%Y%m%d"), m_fin.strftime("%Y%m%d"))
 
-        df_sanity_exec["EJ_NORM"] = df_sanity_exec["EJECUTIVO"].astype(str).map(normalize_name)
-        df_sanity_exec = df_sanity_exec.merge(
-            prog_split[["VEN_NORM", "hechas_mes", "transito_mes", "total_mes"]],
-            left_on="EJ_NORM",
-            right_on="VEN_NORM",
+        # EJ_NORM is carried over from the metas builder
+        df_sanity_exec = df_sanity_exec.join(
+            prog_split[["hechas_mes", "transito_mes", "total_mes"]],
+            on="EJ_NORM",
             how="left",
         )
-        df_sanity_exec.drop(columns=["VEN_NORM"], inplace=True, errors="ignore")
     except Exception:
         df_sanity_exec["hechas_mes"] = np.nan
         df_sanity_exec["transito_mes"] = np.nan
         df_sanity_exec["total_mes"] = np.nan
 
-    df_sanity_exec["ventas_hechas_mes"] = pd.to_numeric(df_sanity_exec.get("hechas_mes"), errors="coerce").fillna(0).astype(int)
-    df_sanity_exec["ventas_en_transito_mes"] = pd.to_numeric(df_sanity_exec.get("transito_mes"), errors="coerce").fillna(0).astype(int)
-    df_sanity_exec["total_ventas_hechas_mes"] = pd.to_numeric(df_sanity_exec.get("total_mes"), errors="coerce").fillna(0).astype(int)
+    df_sanity_exec["ventas_hechas_mes"] = pd.to_numeric(df_sanity_exec.get("hechas_mes"), errors="coerce").fillna(0).astype(np.int32)
+    df_sanity_exec["ventas_en_transito_mes"] = pd.to_numeric(df_sanity_exec.get("transito_mes"), errors="coerce").fillna(0).astype(np.int32)
+    df_sanity_exec["total_ventas_hechas_mes"] = pd.to_numeric(df_sanity_exec.get("total_mes"), errors="coerce").fillna(0).astype(np.int32)
 
     df_sanity_exec.drop(columns=["hechas_mes", "transito_mes", "total_mes"], inplace=True, errors="ignore")
 
-    df_sanity_exec["gap_meta"] = (
-        df_sanity_exec["meta_mes_actual"].astype(int)
-        - df_sanity_exec["total_ventas_hechas_mes"].astype(int)
-    ).astype(int)
+    # monthly counts / metas per ejecutivo are small: keep the sanity count columns int32
+    df_sanity_exec["meta_mes_actual"] = df_sanity_exec["meta_mes_actual"].astype(np.int32)
 
-    df_sanity_exec["dias_hab_equiv_mes"] = float(dias_hab_eq_total)
-    df_sanity_exec["ventas_diarias_necesarias"] = df_sanity_exec["meta_mes_actual"].astype(float) / float(dias_hab_eq_total)
+    df_sanity_exec["gap_meta"] = df_sanity_exec["meta_mes_actual"] - df_sanity_exec["total_ventas_hechas_mes"]
 
     ratio = 0.0 if dias_hab_eq_total <= 0 else float(dias_hab_eq_elapsed) / float(dias_hab_eq_total)
     ratio = min(max(ratio, 0.0), 1.0)
 
-    df_sanity_exec["esperado_a_hoy"] = np.floor(df_sanity_exec["meta_mes_actual"].astype(float) * ratio + 1e-9).astype(int)
-    df_sanity_exec["al_corriente"] = df_sanity_exec["total_ventas_hechas_mes"].astype(int) >= df_sanity_exec["esperado_a_hoy"].astype(int)
+    def _add_pace_columns(df: pd.DataFrame, meta_col: str, total_col: str, gap_col: str) -> pd.DataFrame:
+        """
+        Daily-pace columns shared by the exec / team / centro / global tables:
+        ventas_diarias_necesarias, esperado_a_hoy, al_corriente,
+        ventas_diarias_necesarias_desde_hoy (in that order).
+        Computed as arrays first, then added with a single assign().
+        """
+        meta = df[meta_col].to_numpy(dtype=np.float64)
+        esperado = np.floor(meta * ratio + 1e-9).astype(np.int32)
+        gap_pos = np.clip(df[gap_col].to_numpy(dtype=np.float64), 0.0, None)
+        # the condition is a scalar: divide only when there are remaining days
+        if dias_hab_eq_remaining_for_rate > 0.0:
+            gap_pos = gap_pos / dias_hab_eq_remaining_for_rate
+
+        return df.assign(
+            ventas_diarias_necesarias=meta / float(dias_hab_eq_total),
+            esperado_a_hoy=esperado,
+            al_corriente=df[total_col].to_numpy() >= esperado,
+            ventas_diarias_necesarias_desde_hoy=gap_pos,
+        )
 
-    df_sanity_exec["dias_hab_equiv_restantes"] = float(dias_hab_eq_remaining)
-    gap_pos = df_sanity_exec["gap_meta"].astype(float).clip(lower=0.0)
-    df_sanity_exec["ventas_diarias_necesarias_desde_hoy"] = np.where(
-        float(dias_hab_eq_remaining_for_rate) > 0.0,
-        gap_pos / float(dias_hab_eq_remaining_for_rate),
-        gap_pos,
-    )
+    df_sanity_exec = _add_pace_columns(df_sanity_exec, "meta_mes_actual", "total_ventas_hechas_mes", "gap_meta")
 
     df_sanity_exec = df_sanity_exec[
         [
@@ -1642,17 +2032,20 @@ else:
             "meta_mes_actual",
             "meta_for_sum",
             "gap_meta",
-            "dias_hab_equiv_mes",
             "ventas_diarias_necesarias",
-            "dias_hab_equiv_restantes",
             "ventas_diarias_necesarias_desde_hoy",
+            "is_nuevo",
+            "esperado_a_hoy",  # export-only (Excel), hidden on screen
+            "al_corriente",
         ]
-    ].copy()
+    ]
 
     df_sanity_exec = df_sanity_exec.sort_values(
         ["gap_meta", "ventas_diarias_necesarias_desde_hoy", "ventas_diarias_necesarias"],
         ascending=[False, False, False],
     ).reset_index(drop=True)
+    # is_nuevo comes precomputed from the metas builder (EJ_NORM vs set_nuevos_42d)
+    sanity_is_nuevo = df_sanity_exec.pop("is_nuevo").to_numpy(dtype=bool)
 
     fmt_sanity = {
         "dias_activo_al_1ro": "{:,.0f}",
@@ -1661,117 +2054,72 @@ else:
         "total_ventas_hechas_mes": "{:,.0f}",
         "meta_mes_actual": "{:,.0f}",
         "gap_meta": "{:,.0f}",
-        "dias_hab_equiv_mes": "{:,.2f}",
         "ventas_diarias_necesarias": "{:,.2f}",
-        "dias_hab_equiv_restantes": "{:,.2f}",
         "ventas_diarias_necesarias_desde_hoy": "{:,.2f}",
     }
 
-    tmp_for_style = df_sanity_exec[["EJECUTIVO", "total_ventas_hechas_mes", "meta_mes_actual"]].copy()
-    tmp_for_style["esperado_a_hoy"] = np.floor(tmp_for_style["meta_mes_actual"].astype(float) * ratio + 1e-9).astype(int)
-    tmp_for_style["al_corriente"] = tmp_for_style["total_ventas_hechas_mes"].astype(int) >= tmp_for_style["esperado_a_hoy"].astype(int)
-    style_corriente = dict(zip(tmp_for_style["EJECUTIVO"], tmp_for_style["al_corriente"].astype(bool)))
+    # aligned with the displayed exec rows (same frame, same RangeIndex), like sanity_is_nuevo
+    sanity_al_corriente = df_sanity_exec["al_corriente"].to_numpy(dtype=bool)
 
-    def _blue_transito_exec(row: pd.Series):
-        styles = [""] * len(row)
-        try:
-            v = int(row.get("ventas_en_transito_mes", 0) or 0)
-        except Exception:
-            v = 0
-        if v > 0:
-            idx = row.index.get_loc("ventas_en_transito_mes")
-            styles[idx] = "background-color: #1e90ff; color: white; font-weight: 900;"
+    # whole-table stylers (Styler.apply axis=None): masks over columns, one call per table
+    def _paint_transito(styles: np.ndarray, df: pd.DataFrame, col: str) -> np.ndarray:
+        styles[df[col].to_numpy() > 0, df.columns.get_loc(col)] = CSS_TRANSITO
         return styles
 
-    def highlight_gap_dynamic(row: pd.Series):
-        styles = [""] * len(row)
-        ej = row.get("EJECUTIVO")
-        al_corriente = bool(style_corriente.get(ej, True))
-        try:
-            gap_val = int(row.get("gap_meta", 0) or 0)
-        except Exception:
-            gap_val = 0
-
-        if (gap_val > 0) and (not al_corriente):
-            col_idx = row.index.get_loc("gap_meta")
-            styles[col_idx] = "background-color: #ff1f3d; color: white; font-weight: 900;"
-
-        ej_norm = normalize_name(row.get("EJECUTIVO"))
-        if ej_norm in set_nuevos_42d:
-            for i in range(len(styles)):
-                if i != row.index.get_loc("gap_meta"):
-                    styles[i] = "background-color: #ffd166; color: black; font-weight: 900;"
-
-        blue = _blue_transito_exec(row)
-        for i in range(len(styles)):
-            if blue[i]:
-                styles[i] = blue[i]
-        return styles
+    def highlight_gap_aggregate(df: pd.DataFrame, gap_col: str) -> pd.DataFrame:
+        # team / centro / global: gap > 0 y no va al corriente -> celda gap roja; + tránsito azul
+        styles = np.full(df.shape, "", dtype=object)
+        atrasado = (df[gap_col].to_numpy() > 0) & ~df["al_corriente"].to_numpy(dtype=bool)
+        styles[atrasado, df.columns.get_loc(gap_col)] = CSS_GAP_ATRASADO
+        styles = _paint_transito(styles, df, "ventas_en_transito")
+        return pd.DataFrame(styles, index=df.index, columns=df.columns)
+
+    def highlight_gap_dynamic(df: pd.DataFrame) -> pd.DataFrame:
+        styles = np.full(df.shape, "", dtype=object)
+
+        # nuevos ingresos -> fila amarilla (salvo la celda gap)
+        styles[sanity_is_nuevo] = CSS_ROW_NUEVO
+
+        # gap > 0 y no va al corriente -> celda gap roja
+        atrasado = (df["gap_meta"].to_numpy() > 0) & ~sanity_al_corriente
+        styles[:, df.columns.get_loc("gap_meta")] = np.where(atrasado, CSS_GAP_ATRASADO, "")
+
+        styles = _paint_transito(styles, df, "ventas_en_transito_mes")
+        return pd.DataFrame(styles, index=df.index, columns=df.columns)
+
+    # the two day counts are one scalar per month: shown once here for all the sanity tables
+    # (the Excel export adds them back as columns, see _with_day_count_columns)
+    st.caption(
+        f"Días hábiles equivalentes — mes: {dias_hab_eq_total:,.2f} · restantes: {dias_hab_eq_remaining:,.2f}"
+    )
 
     st.markdown("#### 👤 Por ejecutivo (activo)")
     st.dataframe(
-        df_sanity_exec.drop(columns=["meta_for_sum"]).style.apply(highlight_gap_dynamic, axis=1).format(fmt_sanity),
+        df_sanity_exec.drop(columns=["meta_for_sum", "esperado_a_hoy", "al_corriente"]).style.apply(highlight_gap_dynamic, axis=None).format(fmt_sanity),
         hide_index=True,
         width="stretch",
     )
 
     df_sanity_team = (
-        df_sanity_exec.groupby(["Supervisor"], as_index=False)
+        df_sanity_exec.groupby(["Supervisor"], as_index=False, observed=True, sort=False)
         .agg(
             ejecutivos=("EJECUTIVO", "nunique"),
             ventas_hechas=("ventas_hechas_mes", "sum"),
             ventas_en_transito=("ventas_en_transito_mes", "sum"),
             total_ventas_hechas=("total_ventas_hechas_mes", "sum"),
             meta_team=("meta_for_sum", "sum"),
-            gap_team=("gap_meta", "sum"),
         )
     )
-    df_sanity_team["gap_team"] = df_sanity_team["meta_team"].astype(int) - df_sanity_team["total_ventas_hechas"].astype(int)
-
-    df_sanity_team["dias_hab_equiv_mes"] = float(dias_hab_eq_total)
-    df_sanity_team["ventas_diarias_necesarias"] = df_sanity_team["meta_team"].astype(float) / float(dias_hab_eq_total)
-    df_sanity_team["esperado_a_hoy"] = np.floor(df_sanity_team["meta_team"].astype(float) * ratio + 1e-9).astype(int)
-    df_sanity_team["al_corriente"] = df_sanity_team["total_ventas_hechas"].astype(int) >= df_sanity_team["esperado_a_hoy"].astype(int)
-
-    df_sanity_team["dias_hab_equiv_restantes"] = float(dias_hab_eq_remaining)
-    gap_team_pos = df_sanity_team["gap_team"].astype(float).clip(lower=0.0)
-    df_sanity_team["ventas_diarias_necesarias_desde_hoy"] = np.where(
-        float(dias_hab_eq_remaining_for_rate) > 0.0,
-        gap_team_pos / float(dias_hab_eq_remaining_for_rate),
-        gap_team_pos,
-    )
+    df_sanity_team["gap_team"] = df_sanity_team["meta_team"] - df_sanity_team["total_ventas_hechas"]
+    df_sanity_team = _add_pace_columns(df_sanity_team, "meta_team", "total_ventas_hechas", "gap_team")
 
     df_sanity_team = df_sanity_team.sort_values(
-        ["gap_team", "ventas_diarias_necesarias_desde_hoy", "ventas_diarias_necesarias"],
-        ascending=False
+        ["gap_team", "ventas_diarias_necesarias_desde_hoy", "ventas_diarias_necesarias", "Supervisor"],
+        ascending=[False, False, False, True]
     ).reset_index(drop=True)
 
     st.markdown("#### 🧩 Por Team (Supervisor)")
 
-    def highlight_gap_team(val, al_corriente):
-        try:
-            v = int(val or 0)
-        except Exception:
-            v = 0
-        if v > 0 and (not bool(al_corriente)):
-            return "background-color: #ff1f3d; color: white; font-weight: 900;"
-        return ""
-
-    def _blue_transito_team(row: pd.Series):
-        styles = [""] * len(row)
-        try:
-            v = int(row.get("ventas_en_transito", 0) or 0)
-        except Exception:
-            v = 0
-        if v > 0:
-            idx = row.index.get_loc("ventas_en_transito")
-            styles[idx] = "background-color: #1e90ff; color: white; font-weight: 900;"
-        return styles
-
-    team_gap_styles = [
-        highlight_gap_team(g, c) for g, c in zip(df_sanity_team["gap_team"], df_sanity_team["al_corriente"])
-    ]
-
     st.dataframe(
         df_sanity_team.style.format(
             {
@@ -1781,29 +2129,17 @@ else:
                 "total_ventas_hechas": "{:,.0f}",
                 "meta_team": "{:,.0f}",
                 "gap_team": "{:,.0f}",
-                "dias_hab_equiv_mes": "{:,.2f}",
                 "ventas_diarias_necesarias": "{:,.2f}",
                 "esperado_a_hoy": "{:,.0f}",
-                "dias_hab_equiv_restantes": "{:,.2f}",
                 "ventas_diarias_necesarias_desde_hoy": "{:,.2f}",
             }
-        ).apply(
-            lambda r: (
-                [""] * r.index.get_loc("gap_team")
-                + [team_gap_styles[r.name]]
-                + [""] * (len(r) - r.index.get_loc("gap_team") - 1)
-            ),
-            axis=1,
-        ).apply(
-            _blue_transito_team,
-            axis=1,
-        ),
+        ).apply(highlight_gap_aggregate, axis=None, gap_col="gap_team"),
         hide_index=True,
         width="stretch",
     )
 
     df_sanity_centro = (
-        df_sanity_exec.groupby(["CentroKey"], as_index=False)
+        df_sanity_exec.groupby(["CentroKey"], as_index=False, observed=True, sort=False)
         .agg(
             ejecutivos=("EJECUTIVO", "nunique"),
             ventas_hechas=("ventas_hechas_mes", "sum"),
@@ -1812,43 +2148,16 @@ else:
             meta_centro=("meta_for_sum", "sum"),
         )
     )
-    df_sanity_centro["gap_centro"] = df_sanity_centro["meta_centro"].astype(int) - df_sanity_centro["total_ventas_hechas"].astype(int)
-
-    df_sanity_centro["dias_hab_equiv_mes"] = float(dias_hab_eq_total)
-    df_sanity_centro["ventas_diarias_necesarias"] = df_sanity_centro["meta_centro"].astype(float) / float(dias_hab_eq_total)
-    df_sanity_centro["esperado_a_hoy"] = np.floor(df_sanity_centro["meta_centro"].astype(float) * ratio + 1e-9).astype(int)
-    df_sanity_centro["al_corriente"] = df_sanity_centro["total_ventas_hechas"].astype(int) >= df_sanity_centro["esperado_a_hoy"].astype(int)
-
-    df_sanity_centro["dias_hab_equiv_restantes"] = float(dias_hab_eq_remaining)
-    gap_centro_pos = df_sanity_centro["gap_centro"].astype(float).clip(lower=0.0)
-    df_sanity_centro["ventas_diarias_necesarias_desde_hoy"] = np.where(
-        float(dias_hab_eq_remaining_for_rate) > 0.0,
-        gap_centro_pos / float(dias_hab_eq_remaining_for_rate),
-        gap_centro_pos,
-    )
+    df_sanity_centro["gap_centro"] = df_sanity_centro["meta_centro"] - df_sanity_centro["total_ventas_hechas"]
+    df_sanity_centro = _add_pace_columns(df_sanity_centro, "meta_centro", "total_ventas_hechas", "gap_centro")
 
     df_sanity_centro = df_sanity_centro.sort_values(
-        ["gap_centro", "ventas_diarias_necesarias_desde_hoy", "ventas_diarias_necesarias"],
-        ascending=False
+        ["gap_centro", "ventas_diarias_necesarias_desde_hoy", "ventas_diarias_necesarias", "CentroKey"],
+        ascending=[False, False, False, True]
     ).reset_index(drop=True)
 
     st.markdown("#### 🏢 Por Centro (JV / CC2)")
 
-    def _blue_transito_centro(row: pd.Series):
-        styles = [""] * len(row)
-        try:
-            v = int(row.get("ventas_en_transito", 0) or 0)
-        except Exception:
-            v = 0
-        if v > 0:
-            idx = row.index.get_loc("ventas_en_transito")
-            styles[idx] = "background-color: #1e90ff; color: white; font-weight: 900;"
-        return styles
-
-    centro_gap_styles = [
-        highlight_gap_team(g, c) for g, c in zip(df_sanity_centro["gap_centro"], df_sanity_centro["al_corriente"])
-    ]
-
     st.dataframe(
         df_sanity_centro.style.format(
             {
@@ -1858,77 +2167,38 @@ else:
                 "total_ventas_hechas": "{:,.0f}",
                 "meta_centro": "{:,.0f}",
                 "gap_centro": "{:,.0f}",
-                "dias_hab_equiv_mes": "{:,.2f}",
                 "ventas_diarias_necesarias": "{:,.2f}",
                 "esperado_a_hoy": "{:,.0f}",
-                "dias_hab_equiv_restantes": "{:,.2f}",
                 "ventas_diarias_necesarias_desde_hoy": "{:,.2f}",
             }
-        ).apply(
-            lambda r: (
-                [""] * r.index.get_loc("gap_centro")
-                + [centro_gap_styles[r.name]]
-                + [""] * (len(r) - r.index.get_loc("gap_centro") - 1)
-            ),
-            axis=1,
-        ).apply(
-            _blue_transito_centro,
-            axis=1,
-        ),
+        ).apply(highlight_gap_aggregate, axis=None, gap_col="gap_centro"),
         hide_index=True,
         width="stretch",
     )
 
+    # global = sum of the centro rows: CentroKey is never null and each ejecutivo
+    # (unique in df_sanity_exec) sits in exactly one centro, so no re-scan of exec
+    centro_tot = df_sanity_centro[
+        ["ejecutivos", "ventas_hechas", "ventas_en_transito", "total_ventas_hechas", "meta_centro"]
+    ].to_numpy().sum(axis=0)
     df_sanity_global = pd.DataFrame(
         [{
             "mes": meta_month_key,
-            "dias_hab_equiv_mes": float(dias_hab_eq_total),
-            "ejecutivos_activos": int(df_sanity_exec["EJECUTIVO"].nunique()),
-            "ventas_hechas": int(df_sanity_exec["ventas_hechas_mes"].sum()),
-            "ventas_en_transito": int(df_sanity_exec["ventas_en_transito_mes"].sum()),
-            "total_ventas_hechas": int(df_sanity_exec["total_ventas_hechas_mes"].sum()),
-            "meta_global": int(df_sanity_exec["meta_for_sum"].sum()),
+            "ejecutivos_activos": int(centro_tot[0]),
+            "ventas_hechas": int(centro_tot[1]),
+            "ventas_en_transito": int(centro_tot[2]),
+            "total_ventas_hechas": int(centro_tot[3]),
+            "meta_global": int(centro_tot[4]),
         }]
     )
-    df_sanity_global["gap_global"] = df_sanity_global["meta_global"].astype(int) - df_sanity_global["total_ventas_hechas"].astype(int)
-    df_sanity_global["ventas_diarias_necesarias"] = float(df_sanity_global["meta_global"].sum()) / float(dias_hab_eq_total)
-
-    df_sanity_global["esperado_a_hoy"] = int(np.floor(df_sanity_global["meta_global"].astype(float).iloc[0] * ratio + 1e-9))
-    df_sanity_global["al_corriente"] = int(df_sanity_global["total_ventas_hechas"].iloc[0]) >= int(df_sanity_global["esperado_a_hoy"].astype(int).iloc[0])
-
-    df_sanity_global["dias_hab_equiv_restantes"] = float(dias_hab_eq_remaining)
-    gap_global_pos = df_sanity_global["gap_global"].astype(float).clip(lower=0.0)
-    df_sanity_global["ventas_diarias_necesarias_desde_hoy"] = np.where(
-        float(dias_hab_eq_remaining_for_rate) > 0.0,
-        gap_global_pos / float(dias_hab_eq_remaining_for_rate),
-        gap_global_pos,
-    )
+    df_sanity_global["gap_global"] = df_sanity_global["meta_global"] - df_sanity_global["total_ventas_hechas"]
+    df_sanity_global = _add_pace_columns(df_sanity_global, "meta_global", "total_ventas_hechas", "gap_global")
 
     st.markdown("#### 🌎 Global")
 
-    def highlight_gap_global(row: pd.Series):
-        styles = [""] * len(row)
-        try:
-            gap_val = int(row.get("gap_global", 0) or 0)
-        except Exception:
-            gap_val = 0
-        al_corr = bool(row.get("al_corriente", True))
-        if (gap_val > 0) and (not al_corr):
-            col_idx = row.index.get_loc("gap_global")
-            styles[col_idx] = "background-color: #ff1f3d; color: white; font-weight: 900;"
-        try:
-            vt = int(row.get("ventas_en_transito", 0) or 0)
-        except Exception:
-            vt = 0
-        if vt > 0:
-            col_idx = row.index.get_loc("ventas_en_transito")
-            styles[col_idx] = "background-color: #1e90ff; color: white; font-weight: 900;"
-        return styles
-
     st.dataframe(
         df_sanity_global.style.format(
             {
-                "dias_hab_equiv_mes": "{:,.2f}",
                 "ejecutivos_activos": "{:,.0f}",
                 "ventas_hechas": "{:,.0f}",
                 "ventas_en_transito": "{:,.0f}",
@@ -1937,35 +2207,28 @@ else:
                 "gap_global": "{:,.0f}",
                 "ventas_diarias_necesarias": "{:,.2f}",
                 "esperado_a_hoy": "{:,.0f}",
-                "dias_hab_equiv_restantes": "{:,.2f}",
                 "ventas_diarias_necesarias_desde_hoy": "{:,.2f}",
             }
-        ).apply(highlight_gap_global, axis=1),
+        ).apply(highlight_gap_aggregate, axis=None, gap_col="gap_global"),
         hide_index=True,
         width="stretch",
     )
 
-    df_exec_export = df_sanity_exec.merge(
-        tmp_for_style[["EJECUTIVO", "esperado_a_hoy", "al_corriente"]],
-        on="EJECUTIVO",
-        how="left",
-    )
-
     _sanity_sheets = {
-        "Sanity_Ejecutivo": df_exec_export.drop(columns=["meta_for_sum"]),
+        "Sanity_Ejecutivo": df_sanity_exec.drop(columns=["meta_for_sum"]),
         "Sanity_Team": df_sanity_team,
         "Sanity_Centro": df_sanity_centro,
         "Sanity_Global": df_sanity_global,
     }
 
-    _sanity_styles = {
-        "Sanity_Ejecutivo": lambda ws, df: _style_sanity_excel(ws, df, set_nuevos_42d=set_nuevos_42d),
-        "Sanity_Team":      lambda ws, df: _style_sanity_excel(ws, df),
-        "Sanity_Centro":    lambda ws, df: _style_sanity_excel(ws, df),
-        "Sanity_Global":    lambda ws, df: _style_sanity_excel(ws, df),
-    }
-
-    sanity_xlsx = _to_excel_bytes_multi(_sanity_sheets, style_fns=_sanity_styles)
+    sanity_xlsx = partial(
+        _sanity_to_excel_bytes,
+        _sanity_sheets,
+        "Sanity_Ejecutivo",
+        sanity_is_nuevo,
+        dias_mes=dias_hab_eq_total,
+        dias_restantes=dias_hab_eq_remaining,
+    )
 
     st.download_button(
         "⬇️ Descargar Excel (Sanity check)",
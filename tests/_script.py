@@ -0,0 +1,28 @@
+"""
+Loads top-level definitions out of new_tendency_analysis.py.
+
+The module is a Streamlit script (importing it runs the app), so the requested
+functions / constants are pulled out of its source with ast and exec'd alone.
+"""
+import ast
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SCRIPT = Path(__file__).resolve().parent.parent / "new_tendency_analysis.py"
+
+
+def load(*names: str) -> dict:
+    wanted = set(names)
+    tree = ast.parse(SCRIPT.read_text(encoding="utf-8"))
+    nodes = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name in wanted:
+            node.decorator_list = []
+            nodes.append(node)
+        elif isinstance(node, ast.Assign) and any(getattr(t, "id", None) in wanted for t in node.targets):
+            nodes.append(node)
+    ns = {"pd": pd, "np": np}
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), str(SCRIPT), "exec"), ns)
+    return ns
@@ -0,0 +1,49 @@
+"""add_supervisor_join() regression tests."""
+import unittest
+
+import pandas as pd
+
+from _script import load
+
+add_supervisor_join = load("_COMBINING_MARKS_RE", "normalize_name_series", "add_supervisor_join")["add_supervisor_join"]
+
+
+class AddSupervisorJoinTest(unittest.TestCase):
+    def test_duplicated_empleado_name(self):
+        ventas = pd.DataFrame({
+            "EJECUTIVO": ["Ana López", "Luis Pérez", "Ana López", None],
+            "FOLIO": [1, 2, 3, 4],
+        })
+        empleados = pd.DataFrame({
+            "Nombre": [" ana lopez", "ANA LÓPEZ ", "Luis Perez"],
+            "Supervisor": ["SUP A", "SUP B", "SUP C"],
+        })
+
+        out = add_supervisor_join(ventas, empleados)
+
+        # each Ana sale fans out into one row per empleado entry
+        self.assertEqual(len(out), 6)
+        self.assertEqual(list(out.columns), ["EJECUTIVO", "FOLIO", "EJ_NORM", "Supervisor"])
+        by_folio = out.groupby("FOLIO", sort=True)
+        self.assertEqual(by_folio.size().tolist(), [2, 1, 2, 1])
+        self.assertEqual(
+            out["EJ_NORM"].tolist(),
+            ["ANA LOPEZ", "ANA LOPEZ", "LUIS PEREZ", "ANA LOPEZ", "ANA LOPEZ", ""],
+        )
+        self.assertEqual(
+            out["Supervisor"].astype(str).tolist(),
+            ["SUP A", "SUP B", "SUP C", "SUP A", "SUP B", "BAJA"],
+        )
+
+    def test_unique_names_keep_row_count(self):
+        ventas = pd.DataFrame({"EJECUTIVO": ["Luis Perez", "Nadie"], "FOLIO": [1, 2]})
+        empleados = pd.DataFrame({"Nombre": ["LUIS PÉREZ"], "Supervisor": ["SUP C"]})
+
+        out = add_supervisor_join(ventas, empleados)
+
+        self.assertEqual(out["EJ_NORM"].tolist(), ["LUIS PEREZ", "NADIE"])
+        self.assertEqual(out["Supervisor"].astype(str).tolist(), ["SUP C", "BAJA"])
+
+
+if __name__ == "__main__":
+    unittest.main()
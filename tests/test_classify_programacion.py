@@ -0,0 +1,55 @@
+"""_classify_programacion() regression tests (ESTATUS + VENTA -> IS_TRANSITO / IS_CANC)."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from _script import load
+
+_classify_programacion = load(
+    "_COMBINING_MARKS_RE",
+    "normalize_name_series",
+    "_is_blank_series",
+    "PROGRAMACION_TRANSITO",
+    "_classify_programacion",
+)["_classify_programacion"]
+
+
+class ClassifyProgramacionTest(unittest.TestCase):
+    def test_entregado_with_blank_venta_is_transito(self):
+        venta = ["None", "none", "NONE", " None ", "nan", "", None, np.nan]
+        df = pd.DataFrame({"ESTATUS": ["ENTREGADO"] * len(venta), "VENTA": venta})
+
+        out = _classify_programacion(df)
+
+        self.assertTrue(out["IS_TRANSITO"].all())
+        self.assertFalse(out["IS_CANC"].any())
+
+    def test_entregado_with_venta_is_hecha(self):
+        df = pd.DataFrame({"ESTATUS": [" entregado", "ENTREGADO"], "VENTA": ["V-123", "0"]})
+
+        out = _classify_programacion(df)
+
+        self.assertFalse(out["IS_TRANSITO"].any())
+
+    def test_statuses(self):
+        df = pd.DataFrame({
+            "ESTATUS": ["En Preparación", "SOLICITADO", "BACK OFFICE", "EN ENTREGA", "CANC ERROR", "OTRO"],
+            "VENTA": ["none"] * 6,
+        })
+
+        out = _classify_programacion(df)
+
+        self.assertEqual(out["IS_TRANSITO"].tolist(), [True, True, True, True, False, False])
+        self.assertEqual(out["IS_CANC"].tolist(), [False, False, False, False, True, False])
+
+    def test_missing_venta_column(self):
+        df = pd.DataFrame({"ESTATUS": ["ENTREGADO", "SOLICITADO"]})
+
+        out = _classify_programacion(df)
+
+        self.assertEqual(out["IS_TRANSITO"].tolist(), [False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+"""_is_blank_series() blank-rule tests."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from _script import load
+
+_is_blank_series = load("_is_blank_series")["_is_blank_series"]
+
+
+class IsBlankSeriesTest(unittest.TestCase):
+    def test_blank_values(self):
+        s = pd.Series(["None", " none ", "NONE", "nan", " NaN", "", "   ", None, np.nan])
+        self.assertTrue(_is_blank_series(s).all())
+
+    def test_non_blank_values(self):
+        s = pd.Series(["PLAN 1", "0", "nonexistent", "none x", 0, 199.0])
+        self.assertFalse(_is_blank_series(s).any())
+
+    def test_float_column(self):
+        s = pd.Series([1.5, np.nan, 0.0])
+        self.assertEqual(_is_blank_series(s).tolist(), [False, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()